@@ -0,0 +1,359 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+
+from metrics import ACTUATION_SECONDS, ACTUATION_COMMANDS
+
+# Devices speak newline-delimited JSON over TCP:
+#   -> {"id": 1, "op": "set", "device": "lobby:LIGHTS", "state": "on"}
+#   <- {"id": 1, "ok": true, "state": "on"}
+
+
+class ActuationError(Exception):
+    pass
+
+
+def parse_address(spec):
+    host, sep, port = str(spec).rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"expected HOST:PORT, got {spec!r}")
+    return host or "127.0.0.1", int(port)
+
+
+class ConnectionPool:
+    """Keeps up to `size` open connections to one device gateway and reuses them."""
+
+    def __init__(self, host, port, size=8, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.opened = 0
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []
+        self._ids = 0
+
+    async def request(self, message):
+        self._ids += 1
+        message = dict(message, id=self._ids)
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else None
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+                    self.opened += 1
+                reader, writer = conn
+                writer.write(json.dumps(message).encode() + b"\n")
+                await writer.drain()
+                line = await asyncio.wait_for(reader.readline(), self.timeout)
+                if not line:
+                    raise ConnectionError("connection closed by device")
+                reply = json.loads(line)
+            except (OSError, asyncio.TimeoutError, ValueError) as exc:
+                # Drop the connection: its stream may hold half a reply
+                if conn is not None:
+                    conn[1].close()
+                raise ActuationError(f"{self.host}:{self.port}: {exc or type(exc).__name__}") from exc
+            self._idle.append(conn)
+        if not reply.get("ok"):
+            raise ActuationError(reply.get("error", "device rejected the command"))
+        return reply
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class _Device:
+    __slots__ = ("name", "pool", "desired", "confirmed", "task")
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.desired = None
+        self.confirmed = None
+        self.task = None
+
+
+class Actuator:
+    """Sends appliance ON/OFF commands without blocking the caller.
+
+    set() is thread-safe and returns immediately; an asyncio loop on a
+    background thread runs one worker per device. Each device only
+    remembers the latest requested state, so ON -> OFF -> ON issued while
+    a command is queued or being retried collapses into a single command
+    (or none, if the device is already in that state). Failed commands
+    are retried with exponential backoff and jitter.
+    """
+
+    def __init__(self, address=None, devices=None, pool_size=8, timeout=2.0, retries=3, backoff=0.1,
+                 max_backoff=2.0, on_result=None):
+        # devices maps a device name to its own HOST:PORT; the rest go to address
+        self.address = parse_address(address) if address else None
+        self.routes = {name: parse_address(spec) for name, spec in (devices or {}).items()}
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_result = on_result
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+        self._devices = {}
+        self._pools = {}
+        self._loop = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="actuation", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    def set(self, device, on):
+        if self._loop is None or self._loop.is_closed():
+            raise RuntimeError("Actuator is not running")
+        if self.address is None and device not in self.routes:
+            raise ActuationError(f"No address for device {device!r}")
+        self._loop.call_soon_threadsafe(self._desire, device, bool(on))
+
+    def _route(self, device):
+        address = self.routes.get(device, self.address)
+        if address is None:
+            raise ActuationError(f"No address for device {device!r}")
+        pool = self._pools.get(address)
+        if pool is None:
+            pool = self._pools[address] = ConnectionPool(*address, size=self.pool_size, timeout=self.timeout)
+        return pool
+
+    def _desire(self, name, on):
+        device = self._devices.get(name)
+        if device is None:
+            device = self._devices[name] = _Device(name, self._route(name))
+        if device.desired is not None:
+            self.coalesced += 1
+            ACTUATION_COMMANDS.labels("coalesced").inc()
+        device.desired = on
+        if device.task is None:
+            device.task = self._loop.create_task(self._drive(device))
+
+    async def _drive(self, device):
+        try:
+            while device.desired is not None:
+                on, device.desired = device.desired, None
+                if on == device.confirmed:
+                    self.coalesced += 1
+                    ACTUATION_COMMANDS.labels("coalesced").inc()
+                    continue
+                await self._send(device, on)
+        finally:
+            device.task = None
+
+    async def _send(self, device, on):
+        message = {"op": "set", "device": device.name, "state": "on" if on else "off"}
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                await device.pool.request(message)
+            except ActuationError as exc:
+                ACTUATION_SECONDS.observe(time.perf_counter() - start)
+                device.confirmed = None
+                if attempt == self.retries:
+                    self.failed += 1
+                    ACTUATION_COMMANDS.labels("failed").inc()
+                    self._report(device.name, on, exc)
+                    return
+                self.retried += 1
+                ACTUATION_COMMANDS.labels("retried").inc()
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                if device.desired is not None:
+                    # A newer state arrived while backing off; send that instead
+                    return
+                continue
+            ACTUATION_SECONDS.observe(time.perf_counter() - start)
+            device.confirmed = on
+            self.sent += 1
+            ACTUATION_COMMANDS.labels("ok").inc()
+            self._report(device.name, on, None)
+            return
+
+    def _report(self, device, on, error):
+        if self.on_result:
+            try:
+                self.on_result(device, on, error)
+            except Exception:
+                pass
+
+    async def _idle(self):
+        while True:
+            tasks = [device.task for device in self._devices.values() if device.task is not None]
+            if not tasks:
+                return
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def flush(self, timeout=None):
+        # Block until every queued command has been sent or given up on
+        if self._loop is None or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._idle(), self._loop).result(timeout)
+
+    def stop(self, timeout=5.0):
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            self.flush(timeout)
+        except Exception:
+            pass
+
+        async def close_pools():
+            for pool in self._pools.values():
+                await pool.close()
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_pools(), self._loop).result(timeout)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+    def states(self):
+        return {name: device.confirmed for name, device in self._devices.items()}
+
+    def stats(self):
+        return {"devices": len(self._devices), "sent": self.sent, "failed": self.failed,
+                "retried": self.retried, "coalesced": self.coalesced,
+                "connections": sum(pool.opened for pool in self._pools.values())}
+
+
+class DeviceSimulator:
+    """Local stand-in for a relay / smart plug gateway, for tests and benchmarks.
+
+    Speaks the same protocol as real gateways, holds any number of devices,
+    and can add latency or fail a fraction of commands.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, failure_rate=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.states = {}
+        self.commands = 0
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._server = None
+        self._loop = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(json.dumps(await self._reply(line)).encode() + b"\n")
+                await writer.drain()
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _reply(self, line):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return {"ok": False, "error": "malformed command"}
+        reply = {"id": message.get("id"), "ok": True}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        device = message.get("device")
+        if message.get("op") == "get":
+            reply["state"] = "on" if self.states.get(device) else "off"
+            return reply
+        if message.get("op") != "set" or message.get("state") not in ("on", "off"):
+            return {"id": message.get("id"), "ok": False, "error": "unknown command"}
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            return {"id": message.get("id"), "ok": False, "error": "simulated failure"}
+        self.commands += 1
+        self.states[device] = message["state"] == "on"
+        reply["state"] = message["state"]
+        return reply
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    def start(self):
+        # Runs on its own thread and loop so synchronous callers can use it
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.serve())
+            self._ready.set()
+            self._loop.run_forever()
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="device-simulator", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated appliance gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every command")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of commands that fail")
+    args = parser.parse_args(argv)
+
+    simulator = DeviceSimulator(args.host, args.port, args.latency, args.failure_rate)
+
+    async def run():
+        server = await simulator.serve()
+        print(f"Simulating devices on {simulator.address}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
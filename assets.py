@@ -0,0 +1,66 @@
+import hashlib
+import os
+
+from PIL import Image, ImageTk
+
+CACHE_DIR = ".asset_cache"
+
+
+class AssetCache:
+    """Pre-resized images, decoded once per (path, size).
+
+    Resized copies are also written to cache_dir, keyed on the source file's
+    mtime and size, so a restart decodes a small thumbnail instead of
+    re-decoding and resizing the full image. PhotoImages are shared between
+    every widget that shows the same icon at the same size.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._images = {}
+        self._photos = {}
+
+    def _cache_path(self, path, size):
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_dir, f"{name}-{size[0]}x{size[1]}-{digest}.png")
+
+    def image(self, path, size):
+        key = (path, tuple(size))
+        image = self._images.get(key)
+        if image is None:
+            image = self._images[key] = self._load(path, tuple(size))
+        return image
+
+    def _load(self, path, size):
+        cached = self._cache_path(path, size)
+        try:
+            with Image.open(cached) as image:
+                image.load()
+                return image.copy()
+        except OSError:
+            pass
+        with Image.open(path) as source:
+            image = source.resize(size)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write then rename so a crash never leaves a truncated thumbnail behind
+            tmp = f"{cached}.{os.getpid()}.tmp"
+            image.save(tmp, format="PNG", compress_level=1)
+            os.replace(tmp, cached)
+        except OSError:
+            pass
+        return image
+
+    def photo(self, path, size):
+        key = (path, tuple(size))
+        photo = self._photos.get(key)
+        if photo is None:
+            photo = self._photos[key] = ImageTk.PhotoImage(self.image(path, size))
+        return photo
+
+    def clear(self):
+        self._images.clear()
+        self._photos.clear()
@@ -0,0 +1,450 @@
+import argparse
+import math
+import time
+
+
+def open_source(source):
+    import cv2
+    return cv2.VideoCapture(int(source) if source.isdigit() else source)
+
+
+def bench_detection(args):
+    import cv2
+    import numpy as np
+    from detection import FaceDetector, DETECTION_PRESETS
+
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    modes = ["full"] + [name for name in DETECTION_PRESETS if name in args.modes or not args.modes]
+    detectors = {name: FaceDetector.from_preset(cascade, name) for name in modes if name != "full"}
+    subtractors = {name: cv2.createBackgroundSubtractorMOG2() for name in modes}
+    seconds = {name: 0.0 for name in modes}
+    per_frame = {name: [] for name in modes}
+
+    capture = open_source(args.source)
+    frames = 0
+    while args.frames <= 0 or frames < args.frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames += 1
+        gray = cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2GRAY)
+        for name in modes:
+            motion = np.sum(subtractors[name].apply(gray) > 127) > 5000
+            start = time.perf_counter()
+            if name == "full":
+                faces = cascade.detectMultiScale(gray, 1.1, 4)
+            else:
+                faces = detectors[name].detect(gray, motion=motion)
+            seconds[name] += time.perf_counter() - start
+            per_frame[name].append(len(faces) > 0)
+    capture.release()
+
+    if not frames:
+        print("No frames read from", args.source)
+        return
+    hits = {name: np.asarray(per_frame[name], dtype=bool) for name in modes}
+
+    baseline = hits["full"]
+    print(f"{frames} frames from {args.source}")
+    print(f"{'mode':<10}{'ms/frame':>10}{'speedup':>9}{'det rate':>10}{'recall':>8}{'agree':>8}")
+    for name in modes:
+        ms = seconds[name] * 1000 / frames
+        speedup = seconds["full"] / seconds[name] if seconds[name] else float("inf")
+        rate = hits[name].mean()
+        recall = (hits[name] & baseline).sum() / baseline.sum() if baseline.sum() else 1.0
+        agree = (hits[name] == baseline).mean()
+        print(f"{name:<10}{ms:>10.2f}{speedup:>8.1f}x{rate:>10.1%}{recall:>8.1%}{agree:>8.1%}")
+
+
+def bench_detectors(args):
+    import cv2
+    import numpy as np
+    from detectors import create_detector
+    from motion import MotionDetector
+    from replay import load_labels, label_at
+
+    options = {"cascade": {"mode": args.mode}, "hog": {},
+               "dnn": {"model_path": args.model, "output_format": args.model_format}}
+    names = [name for name in args.backends if name != "dnn" or args.model]
+    detectors = {name: create_detector(name, **options[name]) for name in names}
+    labels = load_labels(args.labels) if args.labels else None
+
+    capture = open_source(args.source)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    frames, grays, times = [], [], []
+    while args.frames <= 0 or len(frames) < args.frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        times.append(len(frames) / fps)
+        frames.append(frame)
+        grays.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    capture.release()
+    if not frames:
+        print("No frames read from", args.source)
+        return
+
+    motion_detector = MotionDetector()
+    motions = [motion_detector.apply(gray) for gray in grays]
+    truth = np.asarray([label_at(labels, t) for t in times], dtype=bool) if labels else None
+
+    print(f"{len(frames)} frames from {args.source}")
+    print(f"{'backend':<10}{'ms/frame':>10}{'det rate':>10}{'recall':>8}{'false pos':>11}")
+    for name, detector in detectors.items():
+        images = frames if detector.needs_color else grays
+        hits = []
+        start = time.perf_counter()
+        for image, motion in zip(images, motions):
+            hits.append(len(detector.detect(image, motion)) > 0)
+        ms = (time.perf_counter() - start) * 1000 / len(frames)
+        hits = np.asarray(hits, dtype=bool)
+        recall = fp = ""
+        if truth is not None:
+            recall = f"{(hits & truth).sum() / truth.sum():.1%}" if truth.sum() else "-"
+            fp = f"{(hits & ~truth).sum() / (~truth).sum():.1%}" if (~truth).sum() else "-"
+        print(f"{name:<10}{ms:>10.2f}{hits.mean():>10.1%}{recall:>8}{fp:>11}")
+
+    dnn = detectors.get("dnn")
+    if dnn is None:
+        return
+    # Batched inference as the engine does it when several cameras share a worker
+    print(f"{'dnn batch':<10}{'ms/frame':>10}{'frames/s':>10}")
+    for size in args.batch_sizes:
+        count = len(frames) - len(frames) % size
+        if not count:
+            continue
+        start = time.perf_counter()
+        for i in range(0, count, size):
+            dnn.detect_batch(frames[i:i + size], motions[i:i + size])
+        elapsed = time.perf_counter() - start
+        batched = "" if dnn.supports_batch or size == 1 else " (model has a fixed batch size)"
+        print(f"{size:<10}{elapsed * 1000 / count:>10.2f}{count / elapsed:>10.1f}{batched}")
+
+
+def bench_motion(args):
+    import tracemalloc
+    import cv2
+    import numpy as np
+    from motion import MotionDetector
+    from replay import synthetic_frames
+
+    def legacy():
+        subtractor = cv2.createBackgroundSubtractorMOG2()
+        return lambda gray: np.sum(subtractor.apply(gray) > 127) > 5000
+
+    variants = {
+        "np.sum": legacy,
+        "countNonZero": lambda: MotionDetector().apply,
+        "grid 4x4": lambda: MotionDetector(grid=(4, 4)).apply,
+        "scale 0.5": lambda: MotionDetector(scale=0.5).apply,
+        "scale 0.5 + grid": lambda: MotionDetector(scale=0.5, grid=(4, 4)).apply,
+    }
+    resolutions = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+
+    print(f"{'resolution':<12}{'variant':<18}{'ms/frame':>10}{'peak alloc':>14}")
+    for label, (width, height) in resolutions.items():
+        frames = list(synthetic_frames(width, height, args.frames))
+        for name, factory in variants.items():
+            score = factory()
+            for frame in frames[:args.warmup]:
+                score(frame)
+            tracemalloc.start()
+            start = time.perf_counter()
+            for frame in frames[args.warmup:]:
+                score(frame)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            timed = max(1, len(frames) - args.warmup)
+            print(f"{label:<12}{name:<18}{elapsed * 1000 / timed:>10.2f}{peak:>12,d} B")
+
+
+class LoopingSource:
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = 0
+
+    def read(self):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        return True, frame
+
+
+def bench_rooms(args):
+    import os
+    from rooms import RoomRegistry, PresenceEngine
+    from replay import synthetic_frames
+
+    width, height = args.size
+    frames = list(synthetic_frames(width, height, 60))
+    workers = args.workers or os.cpu_count() or 1
+    counts = args.cameras or sorted({1, 2, 4, workers, workers * 2})
+
+    print(f"{workers} worker processes, {width}x{height} synthetic frames")
+    print(f"{'cameras':>8}{'aggregate fps':>15}{'per camera':>12}{'dropped':>10}")
+    for count in counts:
+        registry = RoomRegistry()
+        for i in range(count):
+            registry.add_room(f"room{i}")
+            registry.add_camera(f"cam{i}", LoopingSource(frames), f"room{i}", args.mode)
+        with PresenceEngine(registry, workers=workers) as engine:
+            time.sleep(args.warmup)
+            before = {cid: r["processed"] for cid, r in engine.stats()["cameras"].items()}
+            start = time.perf_counter()
+            time.sleep(args.duration)
+            elapsed = time.perf_counter() - start
+            stats = engine.stats()["cameras"]
+        processed = sum(stats[cid]["processed"] - before[cid] for cid in stats)
+        dropped = sum(r["dropped"] for r in stats.values())
+        fps = processed / elapsed
+        print(f"{count:>8}{fps:>15.1f}{fps / count:>12.1f}{dropped:>10}")
+
+
+def bench_logview(args):
+    import datetime
+    import os
+    import random
+    import tempfile
+    from logstore import LogStore
+    from logview import LazyLogTree, LiveFeed
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        result = fn()
+        print(f"{label:<44}{(time.perf_counter() - start) * 1000:>10.1f} ms")
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LogStore(os.path.join(tmp, "bench.db"))
+        per_day = max(1, args.rows // args.days)
+        day0 = datetime.date(2024, 1, 1)
+        rng = random.Random(0)
+
+        def fill():
+            for d in range(args.days):
+                date = (day0 + datetime.timedelta(days=d)).isoformat()
+                rows = []
+                for i in range(per_day):
+                    seconds = i * 86399 // per_day
+                    stamp = f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+                    appliance = rng.choice(("LIGHTS", "AIRCON"))
+                    message = f"{appliance} turned ON" if i % 2 == 0 else f"{appliance} turned OFF after 0:00:30"
+                    rows.append([date, stamp, message])
+                store.write_rows(rows)
+
+        print(f"{per_day * args.days:,} rows over {args.days} days")
+        timed("write rows", fill)
+        dates = timed("list day nodes (lazy viewer open)", lambda: store.dates(descending=True))
+        middle = dates[len(dates) // 2][0]
+        timed("first page of one day (500 rows)", lambda: store.query(middle, middle, limit=501))
+        timed("whole day", lambda: store.query(middle, middle))
+        timed("count one week", lambda: store.count(middle, (datetime.date.fromisoformat(middle)
+                                                              + datetime.timedelta(days=6)).isoformat()))
+        timed("all rows (what the eager viewer loaded)", lambda: sum(1 for _ in store.iter_query()))
+
+        try:
+            import tkinter as tk
+            from tkinter import ttk
+            root = tk.Tk()
+        except Exception as exc:
+            print(f"Treeview timings skipped: {exc}")
+            return
+        root.withdraw()
+        tree = ttk.Treeview(root, columns=("Time", "Activity"))
+        lazy = LazyLogTree(tree, store)
+        timed("Treeview: populate day nodes", lazy.populate)
+        first = tree.get_children()[len(dates) // 2]
+        timed("Treeview: expand one day", lambda: (tree.delete(*tree.get_children(first)), lazy.load_page(first)))
+
+        feed_tree = ttk.Treeview(root, columns=("Time", "Activity"), show="headings")
+        feed = LiveFeed(feed_tree, args.live_rows)
+        timed(f"Treeview: {args.live_events:,} live events, cap {args.live_rows}",
+              lambda: [feed.add(("00:00:00", "LIGHTS turned ON")) for _ in range(args.live_events)])
+        print(f"live feed rows retained: {len(feed_tree.get_children())}")
+        root.destroy()
+        store.close()
+
+
+def bench_actuation(args):
+    from actuation import Actuator, DeviceSimulator
+
+    simulator = DeviceSimulator(latency=args.latency, failure_rate=args.failure_rate, seed=0).start()
+    actuator = Actuator(simulator.address, pool_size=args.pool_size, backoff=0.01).start()
+    devices = [f"room{i // 2}:{'LIGHTS' if i % 2 == 0 else 'AIRCON'}" for i in range(args.devices)]
+
+    # Stand-in for the frame loop: how long do set() calls block it?
+    blocked = []
+    start = time.perf_counter()
+    for flap in range(args.flaps):
+        for device in devices:
+            t0 = time.perf_counter()
+            actuator.set(device, flap % 2 == 0)
+            blocked.append(time.perf_counter() - t0)
+    issued = time.perf_counter() - start
+    actuator.flush(60)
+    elapsed = time.perf_counter() - start
+    stats = actuator.stats()
+    actuator.stop()
+    simulator.stop()
+
+    blocked.sort()
+    requested = args.devices * args.flaps
+    print(f"{args.devices} devices x {args.flaps} flaps, {args.latency * 1000:.0f} ms device latency, "
+          f"{args.failure_rate:.0%} failures")
+    print(f"set() blocked the caller: p50 {blocked[len(blocked) // 2] * 1e6:.1f} us, "
+          f"max {blocked[-1] * 1e6:.1f} us, {issued * 1000:.1f} ms for all {requested}")
+    print(f"{requested} requests -> {simulator.commands} device commands in {elapsed:.2f}s "
+          f"({stats['coalesced']} coalesced, {stats['retried']} retries, {stats['failed']} failed, "
+          f"{stats['connections']} connections)")
+
+
+def bench_energy(args):
+    from energy import EnergyLedger, TariffSchedule, synthetic_history
+
+    appliances, starts, ends = synthetic_history(args.rooms, args.days, args.sessions)
+    tariff = TariffSchedule(0.15, [(17, 22, 0.35, range(5))])
+    print(f"{len(starts):,} ON sessions over {args.days} days, {args.rooms} rooms x 2 appliances")
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        result = fn()
+        print(f"{label:<22}{(time.perf_counter() - start) * 1000:>9.1f} ms")
+        return result
+
+    ledger = timed("build ledger", lambda: EnergyLedger(appliances, starts, ends, tariff=tariff))
+    timed("hourly seconds", ledger.hourly_seconds)
+    timed("hourly rollup", ledger.hourly)
+    timed("daily rollup", ledger.daily)
+    monthly = timed("monthly rollup", ledger.monthly)
+    savings = timed("savings vs always-on", ledger.savings)["total"]
+    print(f"{monthly.kwh.sum():,.0f} kWh, cost {monthly.cost.sum():,.2f}; saved {savings['saved_kwh']:,.0f} kWh "
+          f"({savings['saved_cost']:,.2f}) versus always on")
+
+
+def bench_scheduler(args):
+    import types
+    from rooms import Room
+    from scheduler import FrameScheduler
+
+    # Simulated clock and a perfect detector: measures how many frames the
+    # adaptive rate decodes and how quickly entries and exits are noticed.
+    # As in the live loop, the next sample is booked when a frame is
+    # captured, before detection has seen it; Throttle then re-checks the
+    # interval every `poll` seconds, so a faster rate takes effect on the
+    # first wake-up after the detection result lands.
+    spans, t = [], 0.0
+    while t < args.hours * 3600:
+        t += args.empty_minutes * 60
+        spans.append((t, t + args.occupied_minutes * 60))
+        t += args.occupied_minutes * 60
+    latency = args.detect_ms / 1000.0
+    poll = 0.05
+
+    def simulate(scheduled):
+        clock = [0.0]
+        room = Room(clock=lambda: clock[0])
+        scheduler = FrameScheduler(room, active_fps=args.fps, monitor=types.SimpleNamespace(load=0.0))
+        frames, entered, left, span = 0, [], [], 0
+        end = args.hours * 3600
+        while clock[0] < end:
+            captured = clock[0]
+            booked = scheduler.interval() if scheduled else 1.0 / args.fps
+            while span < len(spans) and captured >= spans[span][1] and not room.occupancy.present:
+                span += 1
+            inside = span < len(spans) and spans[span][0] <= captured < spans[span][1]
+            was_present = room.occupancy.present
+            clock[0] = captured + latency
+            room.update(inside)
+            frames += 1
+            if room.occupancy.present and not was_present and span < len(spans):
+                entered.append(clock[0] - spans[span][0])
+            elif was_present and not room.occupancy.present and span < len(spans):
+                left.append(clock[0] - spans[span][1])
+                span += 1
+            if not scheduled or booked <= latency:
+                clock[0] = captured + booked
+                continue
+            # First wake-up at or after the result, then wait out the new interval
+            woke = min(captured + booked, captured + math.ceil(latency / poll) * poll)
+            clock[0] = max(woke, captured + scheduler.interval())
+        return frames, entered, left
+
+    print(f"{args.hours:g} h, {args.occupied_minutes:g} min occupied every {args.empty_minutes:g} min empty")
+    print(f"{'mode':<10}{'frames':>10}{'avg fps':>9}{'entry ms':>10}{'exit ms':>9}")
+    for name, scheduled in (("fixed", False), ("adaptive", True)):
+        frames, entered, left = simulate(scheduled)
+        entry = max(entered) * 1000 if entered else 0.0
+        exit_ = max(left) * 1000 if left else 0.0
+        print(f"{name:<10}{frames:>10,}{frames / (args.hours * 3600):>9.2f}{entry:>10.0f}{exit_:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PRESENCE benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    detection = sub.add_parser("detection", help="adaptive face detection vs full-frame cascade")
+    detection.add_argument("source", help="video file or camera index")
+    detection.add_argument("--frames", type=int, default=0, help="stop after N frames (0 = all)")
+    detection.add_argument("--modes", nargs="*", default=[], help="presets to compare (default: all)")
+    detection.set_defaults(func=bench_detection)
+
+    detectors = sub.add_parser("detectors", help="cascade vs HOG vs ONNX DNN on the same footage")
+    detectors.add_argument("source", help="video file or camera index")
+    detectors.add_argument("--frames", type=int, default=300, help="stop after N frames (0 = all)")
+    detectors.add_argument("--backends", nargs="*", default=["cascade", "hog", "dnn"])
+    detectors.add_argument("--mode", default="balanced", help="cascade detection preset")
+    detectors.add_argument("--model", help="ONNX person model for the dnn backend (skipped without one)")
+    detectors.add_argument("--model-format", choices=["ssd", "yolov8"], default="ssd")
+    detectors.add_argument("--batch-sizes", type=int, nargs="*", default=[1, 4, 8])
+    detectors.add_argument("--labels", help="CSV of occupied spans for recall / false positive rates")
+    detectors.set_defaults(func=bench_detectors)
+
+    motion = sub.add_parser("motion", help="motion scoring at 480p/720p/1080p on synthetic frames")
+    motion.add_argument("--frames", type=int, default=200)
+    motion.add_argument("--warmup", type=int, default=20)
+    motion.set_defaults(func=bench_motion)
+
+    rooms = sub.add_parser("rooms", help="aggregate detection FPS as cameras are added")
+    rooms.add_argument("--cameras", type=int, nargs="*", default=[], help="camera counts to try")
+    rooms.add_argument("--workers", type=int, default=0, help="worker processes (default: all cores)")
+    rooms.add_argument("--size", type=int, nargs=2, default=(640, 480), metavar=("W", "H"))
+    rooms.add_argument("--mode", default="balanced", help="detection preset")
+    rooms.add_argument("--duration", type=float, default=5.0)
+    rooms.add_argument("--warmup", type=float, default=2.0)
+    rooms.set_defaults(func=bench_rooms)
+
+    logview = sub.add_parser("logview", help="lazy log viewer and live feed at 1M rows")
+    logview.add_argument("--rows", type=int, default=1_000_000)
+    logview.add_argument("--days", type=int, default=365)
+    logview.add_argument("--live-events", type=int, default=1_000_000)
+    logview.add_argument("--live-rows", type=int, default=500)
+    logview.set_defaults(func=bench_logview)
+
+    actuation = sub.add_parser("actuation", help="appliance commands against the local device simulator")
+    actuation.add_argument("--devices", type=int, default=500)
+    actuation.add_argument("--flaps", type=int, default=3, help="alternating ON/OFF requests per device")
+    actuation.add_argument("--latency", type=float, default=0.01, help="simulated device latency in seconds")
+    actuation.add_argument("--failure-rate", type=float, default=0.05)
+    actuation.add_argument("--pool-size", type=int, default=16)
+    actuation.set_defaults(func=bench_actuation)
+
+    energy = sub.add_parser("energy", help="kWh / cost rollups over a year of multi-room history")
+    energy.add_argument("--rooms", type=int, default=20)
+    energy.add_argument("--days", type=int, default=365)
+    energy.add_argument("--sessions", type=int, default=12, help="ON sessions per appliance per day")
+    energy.set_defaults(func=bench_energy)
+
+    scheduler = sub.add_parser("scheduler", help="frames decoded with a fixed vs adaptive rate (simulated)")
+    scheduler.add_argument("--hours", type=float, default=24)
+    scheduler.add_argument("--fps", type=float, default=15.0)
+    scheduler.add_argument("--occupied-minutes", type=float, default=45)
+    scheduler.add_argument("--empty-minutes", type=float, default=90)
+    scheduler.add_argument("--detect-ms", type=float, default=30, help="simulated detection latency per frame")
+    scheduler.set_defaults(func=bench_scheduler)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
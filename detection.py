@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+
+# scale: fraction of the frame the cascade runs on
+# skip_interval: while motion confirms a recent face, run the cascade only every Nth frame
+# full_scan_interval: force a full-frame pass this often even while tracking an ROI
+DETECTION_PRESETS = {
+    "accurate": dict(scale=1.0, use_roi=False, skip_interval=1, full_scan_interval=1),
+    "balanced": dict(scale=0.5, use_roi=True, skip_interval=3, full_scan_interval=15),
+    "fast": dict(scale=0.33, use_roi=True, skip_interval=6, full_scan_interval=30),
+}
+
+NO_FACES = np.empty((0, 4), dtype=np.int32)
+
+
+class FaceDetector:
+    def __init__(self, cascade, scale=0.5, scale_factor=1.1, min_neighbors=4,
+                 use_roi=True, roi_margin=0.6, roi_max_misses=3,
+                 skip_interval=3, full_scan_interval=15):
+        self.cascade = cascade
+        self.scale = scale
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.use_roi = use_roi
+        self.roi_margin = roi_margin
+        self.roi_max_misses = roi_max_misses
+        self.skip_interval = max(1, skip_interval)
+        self.full_scan_interval = max(1, full_scan_interval)
+
+        self.last_faces = NO_FACES
+        self._roi_misses = 0
+        self._since_pass = 0
+        self._since_full = 0
+        self._small = None
+        self.stats = {"frames": 0, "skipped": 0, "roi_passes": 0, "full_passes": 0, "hits": 0}
+
+    @classmethod
+    def from_preset(cls, cascade, name, **overrides):
+        options = dict(DETECTION_PRESETS[name])
+        options.update(overrides)
+        return cls(cascade, **options)
+
+    def reset(self):
+        self.last_faces = NO_FACES
+        self._roi_misses = 0
+        self._since_pass = 0
+        self._since_full = 0
+
+    def detect(self, gray, motion=False):
+        self.stats["frames"] += 1
+        self._since_pass += 1
+        self._since_full += 1
+
+        # A face seen recently plus ongoing motion means the room is occupied;
+        # the cascade only has to re-confirm every skip_interval frames.
+        if motion and len(self.last_faces) and self._since_pass < self.skip_interval:
+            self.stats["skipped"] += 1
+            return self.last_faces
+        self._since_pass = 0
+
+        small = self._downscale(gray)
+        faces = NO_FACES
+        tracking = self.use_roi and len(self.last_faces) and self._roi_misses < self.roi_max_misses
+        full = not (tracking and self._since_full < self.full_scan_interval)
+        if not full:
+            faces = self._detect_roi(small)
+            self.stats["roi_passes"] += 1
+            self._roi_misses = 0 if len(faces) else self._roi_misses + 1
+        else:
+            faces = self._detect_full(small)
+            self.stats["full_passes"] += 1
+            self._since_full = 0
+            self._roi_misses = 0
+
+        if len(faces):
+            self.stats["hits"] += 1
+            self.last_faces = faces
+        elif full or self._roi_misses >= self.roi_max_misses:
+            # A full scan that finds nobody is authoritative, even mid-tracking
+            self.last_faces = NO_FACES
+        return faces
+
+    def _downscale(self, gray):
+        if self.scale >= 1.0:
+            return gray
+        h, w = gray.shape[:2]
+        size = (max(1, int(w * self.scale)), max(1, int(h * self.scale)))
+        if self._small is None or self._small.shape[::-1] != size:
+            self._small = np.empty((size[1], size[0]), dtype=gray.dtype)
+        cv2.resize(gray, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        return self._small
+
+    def _run_cascade(self, image):
+        found = self.cascade.detectMultiScale(image, self.scale_factor, self.min_neighbors)
+        if len(found) == 0:
+            return NO_FACES
+        return np.asarray(found, dtype=np.int32)
+
+    def _to_full(self, boxes, dx=0, dy=0):
+        if not len(boxes):
+            return NO_FACES
+        mapped = boxes.astype(np.float32)
+        mapped[:, 0] += dx
+        mapped[:, 1] += dy
+        if self.scale < 1.0:
+            mapped /= self.scale
+        return mapped.round().astype(np.int32)
+
+    def _detect_full(self, small):
+        return self._to_full(self._run_cascade(small))
+
+    def _detect_roi(self, small):
+        h, w = small.shape[:2]
+        scale = min(self.scale, 1.0)
+        boxes = self.last_faces.astype(np.float32) * scale
+        x0, y0 = boxes[:, 0].min(), boxes[:, 1].min()
+        x1, y1 = (boxes[:, 0] + boxes[:, 2]).max(), (boxes[:, 1] + boxes[:, 3]).max()
+        pad_x, pad_y = (x1 - x0) * self.roi_margin, (y1 - y0) * self.roi_margin
+        left, top = max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y))
+        right, bottom = min(w, int(x1 + pad_x)), min(h, int(y1 + pad_y))
+        if right - left < 8 or bottom - top < 8:
+            return NO_FACES
+        return self._to_full(self._run_cascade(small[top:bottom, left:right]), left, top)
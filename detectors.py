@@ -0,0 +1,215 @@
+import threading
+
+import cv2
+import numpy as np
+
+from detection import FaceDetector, NO_FACES
+
+# Heavy models are loaded once per process and shared by every camera in it
+_models = {}
+_models_lock = threading.Lock()
+
+
+def shared_model(key, factory):
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = factory()
+        return model
+
+
+def default_cascade():
+    path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    return shared_model(("cascade", path), lambda: cv2.CascadeClassifier(path))
+
+
+class DetectorBackend:
+    """Finds people in a frame and returns (x, y, w, h) boxes.
+
+    needs_color: the backend wants BGR frames rather than grayscale.
+    per_camera: the backend keeps tracking state, so each camera needs its
+    own instance. batchable: detect_batch() is cheaper than a loop.
+    """
+
+    name = None
+    needs_color = False
+    per_camera = False
+    batchable = False
+
+    def detect(self, image, motion=False):
+        return self.detect_batch([image], [motion])[0]
+
+    def detect_batch(self, images, motions):
+        return [self.detect(image, motion) for image, motion in zip(images, motions)]
+
+    def warm_up(self):
+        # Called once when the engine starts; raise here rather than on every frame
+        pass
+
+
+class CascadeBackend(DetectorBackend):
+    name = "cascade"
+    per_camera = True
+
+    def __init__(self, cascade=None, mode="balanced", **options):
+        self.face_detector = FaceDetector.from_preset(cascade or default_cascade(), mode, **options)
+
+    def detect(self, image, motion=False):
+        return self.face_detector.detect(image, motion=motion)
+
+
+class HogBackend(DetectorBackend):
+    # OpenCV's 64x128 HOG+SVM people detector; finds bodies from any side
+    name = "hog"
+
+    def __init__(self, scale=0.75, win_stride=8, padding=8, scale_factor=1.05, hit_threshold=0.0, **options):
+        self.scale = scale
+        self.win_stride = (win_stride, win_stride)
+        self.padding = (padding, padding)
+        self.scale_factor = scale_factor
+        self.hit_threshold = hit_threshold
+        self.hog = shared_model("hog-people", self._create)
+
+    @staticmethod
+    def _create():
+        hog = cv2.HOGDescriptor()
+        hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        return hog
+
+    def detect(self, image, motion=False):
+        small = image
+        if self.scale < 1.0:
+            small = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        rects, _ = self.hog.detectMultiScale(small, hitThreshold=self.hit_threshold, winStride=self.win_stride,
+                                             padding=self.padding, scale=self.scale_factor)
+        if len(rects) == 0:
+            return NO_FACES
+        boxes = np.asarray(rects, dtype=np.float32)
+        if self.scale < 1.0:
+            boxes /= self.scale
+        return boxes.round().astype(np.int32)
+
+
+class DnnBackend(DetectorBackend):
+    """Person detector running an ONNX model through cv2.dnn on the CPU.
+
+    output_format "ssd" expects a DetectionOutput tensor of
+    [image_id, class, score, x1, y1, x2, y2] rows (normalised coordinates);
+    "yolov8" expects (batch, 4 + classes, anchors). input_size, scale and
+    mean default to what the format's reference exports were trained with
+    (MobileNet-SSD: 300x300, (x - 127.5) / 127.5; YOLOv8: 640x640, x / 255).
+    Frames from several cameras are stacked into one blob; models exported
+    with a fixed batch size of 1 fall back to one forward pass per frame.
+    """
+
+    name = "dnn"
+    needs_color = True
+    batchable = True
+    PERSON_CLASS = {"ssd": 15, "yolov8": 0}
+    PREPROCESS = {
+        "ssd": {"input_size": (300, 300), "scale": 1 / 127.5, "mean": (127.5, 127.5, 127.5)},
+        "yolov8": {"input_size": (640, 640), "scale": 1 / 255.0, "mean": (0.0, 0.0, 0.0)},
+    }
+
+    def __init__(self, model_path=None, output_format="ssd", input_size=None, confidence=0.5, nms=0.45,
+                 person_class=None, scale=None, mean=None, swap_rb=True, **options):
+        if not model_path:
+            raise ValueError("The dnn backend needs model_path pointing at an ONNX person model")
+        if output_format not in self.PERSON_CLASS:
+            raise ValueError(f"Unknown output_format {output_format!r}")
+        defaults = self.PREPROCESS[output_format]
+        self.output_format = output_format
+        self.input_size = tuple(defaults["input_size"] if input_size is None else input_size)
+        self.confidence = confidence
+        self.nms = nms
+        self.person_class = self.PERSON_CLASS[output_format] if person_class is None else person_class
+        self.scale = defaults["scale"] if scale is None else scale
+        self.mean = defaults["mean"] if mean is None else mean
+        self.swap_rb = swap_rb
+        self.net = shared_model(("onnx", model_path), lambda: self._load(model_path))
+        self.supports_batch = True
+
+    @staticmethod
+    def _load(model_path):
+        net = cv2.dnn.readNetFromONNX(model_path)
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        return net
+
+    def warm_up(self):
+        # A model whose fixed input does not match input_size fails here, at start-up
+        w, h = self.input_size
+        self._forward([np.zeros((h, w, 3), dtype=np.uint8)])
+
+    def detect_batch(self, images, motions):
+        if not images:
+            return []
+        if len(images) > 1 and self.supports_batch:
+            try:
+                return self._forward(images)
+            except cv2.error:
+                self.supports_batch = False
+        results = []
+        for image in images:
+            results.extend(self._forward([image]))
+        return results
+
+    def _forward(self, images):
+        blob = cv2.dnn.blobFromImages(images, self.scale, self.input_size, self.mean,
+                                      swapRB=self.swap_rb, crop=False)
+        self.net.setInput(blob)
+        output = self.net.forward()
+        if self.output_format == "ssd":
+            return self._decode_ssd(output, images)
+        return self._decode_yolov8(output, images)
+
+    def _decode_ssd(self, output, images):
+        rows = output.reshape(-1, 7)
+        keep = (rows[:, 1] == self.person_class) & (rows[:, 2] >= self.confidence)
+        rows = rows[keep]
+        results = []
+        for index, image in enumerate(images):
+            h, w = image.shape[:2]
+            mine = rows[rows[:, 0] == index]
+            if not len(mine):
+                results.append(NO_FACES)
+                continue
+            x1, y1 = mine[:, 3] * w, mine[:, 4] * h
+            x2, y2 = mine[:, 5] * w, mine[:, 6] * h
+            boxes = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1)
+            results.append(self._nms(boxes, mine[:, 2]))
+        return results
+
+    def _decode_yolov8(self, output, images):
+        results = []
+        in_w, in_h = self.input_size
+        for index, image in enumerate(images):
+            h, w = image.shape[:2]
+            preds = output[index].T
+            scores = preds[:, 4 + self.person_class]
+            mine = preds[scores >= self.confidence]
+            if not len(mine):
+                results.append(NO_FACES)
+                continue
+            cx, cy = mine[:, 0] * (w / in_w), mine[:, 1] * (h / in_h)
+            bw, bh = mine[:, 2] * (w / in_w), mine[:, 3] * (h / in_h)
+            boxes = np.stack([cx - bw / 2, cy - bh / 2, bw, bh], axis=1)
+            results.append(self._nms(boxes, scores[scores >= self.confidence]))
+        return results
+
+    def _nms(self, boxes, scores):
+        keep = cv2.dnn.NMSBoxes(boxes.tolist(), scores.astype(float).tolist(), self.confidence, self.nms)
+        if len(keep) == 0:
+            return NO_FACES
+        return boxes[np.asarray(keep).reshape(-1)].round().astype(np.int32)
+
+
+BACKENDS = {backend.name: backend for backend in (CascadeBackend, HogBackend, DnnBackend)}
+
+
+def create_detector(name, **options):
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown detector backend {name!r}; choose from {', '.join(BACKENDS)}") from None
+    return backend(**options)
@@ -0,0 +1,102 @@
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from metrics import STAGE_SECONDS, room_label
+
+
+class PreviewRenderer:
+    """Draws camera frames into a Tk label without per-frame allocations.
+
+    The mirrored RGBA image is written into preallocated buffers and pasted
+    into a single reused PhotoImage. Rendering is capped at max_fps
+    independently of the detection rate, skipped while the window is
+    hidden or minimised, and can be downscaled with `scale`.
+    """
+
+    def __init__(self, label, max_fps=15, scale=1.0, blank_size=(640, 480), mirror=True, room=None):
+        self.label = label
+        self._render_seconds = STAGE_SECONDS.labels("preview", room_label(room))
+        self.max_fps = max_fps
+        self.scale = scale
+        self.blank_size = blank_size
+        self.mirror = mirror
+
+        self.rendered = 0
+        self.skipped = 0
+        self._last_render = 0.0
+        self._source_shape = None
+        self._scaled = None
+        self._rgb = None
+        self._mirrored = None
+        self._image = None
+        self._photo = None
+        self._blank_photo = None
+        self._showing_blank = False
+
+    def visible(self):
+        try:
+            return bool(self.label.winfo_viewable()) and self.label.winfo_toplevel().state() != "iconic"
+        except Exception:
+            return False
+
+    def due(self):
+        if self.max_fps and time.monotonic() - self._last_render < 1.0 / self.max_fps:
+            return False
+        return self.visible()
+
+    def _prepare(self, shape):
+        h, w = shape[:2]
+        if self.scale < 1.0:
+            w, h = max(1, int(w * self.scale)), max(1, int(h * self.scale))
+            self._scaled = np.empty((h, w, 3), dtype=np.uint8)
+        else:
+            self._scaled = None
+        # 4-channel buffers: PIL only shares memory with frombuffer() for
+        # 32-bit modes, so refreshing the buffer refreshes the image in place
+        self._rgb = np.empty((h, w, 4), dtype=np.uint8)
+        self._mirrored = np.empty((h, w, 4), dtype=np.uint8) if self.mirror else None
+        out = self._mirrored if self.mirror else self._rgb
+        self._image = Image.frombuffer("RGBA", (w, h), out, "raw", "RGBA", 0, 1)
+        self._photo = ImageTk.PhotoImage("RGBA", (w, h))
+        self._source_shape = shape
+
+    def render(self, frame):
+        if not self.due():
+            self.skipped += 1
+            return False
+        with self._render_seconds.time():
+            self._render(frame)
+        self._last_render = time.monotonic()
+        self.rendered += 1
+        return True
+
+    def _render(self, frame):
+        if self._source_shape != frame.shape:
+            self._prepare(frame.shape)
+
+        source = frame
+        if self._scaled is not None:
+            cv2.resize(frame, (self._scaled.shape[1], self._scaled.shape[0]), dst=self._scaled,
+                       interpolation=cv2.INTER_AREA)
+            source = self._scaled
+        cv2.cvtColor(source, cv2.COLOR_BGR2RGBA, dst=self._rgb)
+        if self.mirror:
+            cv2.flip(self._rgb, 1, dst=self._mirrored)
+
+        self._photo.paste(self._image)
+        if self._showing_blank or self.label.cget("image") != str(self._photo):
+            self.label.configure(image=self._photo)
+            self.label.imgtk = self._photo
+            self._showing_blank = False
+
+    def render_blank(self):
+        if self._showing_blank:
+            return
+        if self._blank_photo is None:
+            self._blank_photo = ImageTk.PhotoImage(image=Image.new("RGB", self.blank_size, "black"))
+        self.label.configure(image=self._blank_photo)
+        self.label.imgtk = self._blank_photo
+        self._showing_blank = True
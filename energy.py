@@ -0,0 +1,202 @@
+import collections
+import datetime
+
+import numpy as np
+
+HOUR = 3600
+DAY = 86400
+
+# Rated draw in watts; rooms share these unless a "room:APPLIANCE" key overrides them
+DEFAULT_WATTS = {"LIGHTS": 60.0, "AIRCON": 1000.0}
+
+Rollup = collections.namedtuple("Rollup", ["periods", "appliances", "kwh", "cost"])
+
+
+class TariffSchedule:
+    """Price per kWh for every hour of the week.
+
+    periods are (start_hour, end_hour, rate) or (start_hour, end_hour, rate,
+    weekdays) with weekdays as ints (Monday = 0); later periods override
+    earlier ones and end_hour may wrap past midnight, in which case the
+    hours after midnight belong to the following day.
+    """
+
+    def __init__(self, default_rate=0.20, periods=()):
+        self.rates = np.full((7, 24), float(default_rate))
+        for period in periods:
+            start, end, rate = period[:3]
+            weekdays = np.array(list(period[3]) if len(period) > 3 else range(7), dtype=np.int64)
+            if end > start:
+                self.rates[np.ix_(weekdays, np.arange(start, end))] = rate
+            else:
+                self.rates[np.ix_(weekdays, np.arange(start, 24))] = rate
+                self.rates[np.ix_((weekdays + 1) % 7, np.arange(0, end))] = rate
+
+    def hourly_rates(self, hour_starts):
+        # hour_starts: epoch seconds of naive local time; 1970-01-01 was a Thursday
+        days = hour_starts // DAY
+        return self.rates[(days + 3) % 7, (hour_starts % DAY) // HOUR]
+
+
+def _to_seconds(stamps):
+    return np.asarray(stamps, dtype="datetime64[s]").astype(np.int64)
+
+
+def _coverage(starts, ends, edges):
+    """ON-seconds of one appliance before each edge, for sorted, non-overlapping intervals.
+
+    F(t) = sum over s < t of (t - s) minus sum over e < t of (t - e), which
+    equals the clipped interval lengths; two searchsorted calls replace a
+    per-interval loop.
+    """
+    starts = np.sort(starts)
+    ends = np.sort(ends)
+    start_sums = np.concatenate(([0], np.cumsum(starts)))
+    end_sums = np.concatenate(([0], np.cumsum(ends)))
+    n_started = np.searchsorted(starts, edges, side="left")
+    n_ended = np.searchsorted(ends, edges, side="left")
+    return (edges * n_started - start_sums[n_started]) - (edges * n_ended - end_sums[n_ended])
+
+
+class EnergyLedger:
+    """Per-appliance ON intervals with vectorised energy and cost rollups.
+
+    Times are epoch seconds of the naive local timestamps the log records.
+    The ledger covers whole days from the first to the last interval unless
+    start/end dates are given; intervals are clipped to that span.
+    """
+
+    def __init__(self, appliances, starts, ends, watts=None, tariff=None, start=None, end=None):
+        self.watts = dict(DEFAULT_WATTS, **(watts or {}))
+        self.tariff = tariff or TariffSchedule()
+        appliances = np.asarray(appliances, dtype=object)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+
+        if start is not None:
+            self.start = int(_to_seconds(start))
+        else:
+            self.start = int(starts.min()) // DAY * DAY if len(starts) else 0
+        if end is not None:
+            self.end = int(_to_seconds(end)) + DAY
+        else:
+            self.end = (int(ends.max()) // DAY + 1) * DAY if len(ends) else self.start
+        starts = np.clip(starts, self.start, self.end)
+        ends = np.clip(ends, self.start, self.end)
+        keep = ends > starts
+
+        self.appliances = sorted(set(appliances[keep]))
+        self._intervals = {appliance: (starts[keep & (appliances == appliance)],
+                                       ends[keep & (appliances == appliance)])
+                           for appliance in self.appliances}
+        self._hourly_seconds = None
+
+    @classmethod
+    def from_store(cls, store, start=None, end=None, watts=None, tariff=None, until=None):
+        """Builds the ledger from OFF rows (end time and duration) in a LogStore.
+
+        Appliances still ON at the end of the log are counted up to `until`
+        (a datetime) when given.
+        """
+        ends, durations, appliances = store.sessions(start, end)
+        ends = _to_seconds(ends) if len(ends) else np.empty(0, np.int64)
+        starts = ends - np.rint(np.asarray(durations, dtype=np.float64)).astype(np.int64)
+        appliances = list(appliances)
+        if until is not None:
+            now = int(_to_seconds(until.strftime("%Y-%m-%dT%H:%M:%S")))
+            opened = store.open_sessions()
+            if opened:
+                starts = np.concatenate((starts, _to_seconds(list(opened.values()))))
+                ends = np.concatenate((ends, np.full(len(opened), now, np.int64)))
+                appliances.extend(opened)
+        return cls(appliances, starts, ends, watts, tariff, start, end)
+
+    def watts_for(self, appliance):
+        if appliance in self.watts:
+            return self.watts[appliance]
+        return self.watts.get(appliance.rpartition(":")[2], 0.0)
+
+    def _hour_edges(self):
+        return np.arange(self.start, self.end + 1, HOUR, dtype=np.int64)
+
+    def hourly_seconds(self):
+        # appliances x hours matrix of ON-seconds, computed once
+        if self._hourly_seconds is None:
+            edges = self._hour_edges()
+            seconds = np.zeros((len(self.appliances), len(edges) - 1))
+            for row, appliance in enumerate(self.appliances):
+                starts, ends = self._intervals[appliance]
+                seconds[row] = np.diff(_coverage(starts, ends, edges))
+            self._hourly_seconds = seconds
+        return self._hourly_seconds
+
+    def _rollup(self, periods, bins):
+        seconds = self.hourly_seconds()
+        watts = np.array([self.watts_for(a) for a in self.appliances])[:, None]
+        kwh = seconds / HOUR * watts / 1000.0
+        cost = kwh * self.tariff.hourly_rates(self._hour_edges()[:-1])[None, :]
+        if bins is not None:
+            kwh = np.add.reduceat(kwh, bins, axis=1) if kwh.shape[1] else kwh
+            cost = np.add.reduceat(cost, bins, axis=1) if cost.shape[1] else cost
+        return Rollup(periods, list(self.appliances), kwh, cost)
+
+    def hourly(self):
+        hours = self._hour_edges()[:-1].astype("datetime64[s]").astype("datetime64[h]")
+        return self._rollup([str(h) for h in hours], None)
+
+    def daily(self):
+        days = np.arange(self.start, self.end, DAY).astype("datetime64[s]").astype("datetime64[D]")
+        return self._rollup([str(d) for d in days], np.arange(len(days)) * 24)
+
+    def monthly(self):
+        days = np.arange(self.start, self.end, DAY).astype("datetime64[s]").astype("datetime64[D]")
+        months = days.astype("datetime64[M]")
+        first = np.flatnonzero(np.concatenate(([True], months[1:] != months[:-1])))
+        return self._rollup([str(m) for m in months[first]], first * 24)
+
+    def savings(self, baseline_hours=None):
+        """kWh and cost saved versus keeping every appliance on for the whole span.
+
+        baseline_hours=(start_hour, end_hour) limits the baseline to those
+        hours of each day, e.g. (8, 18) for "on during office hours".
+        """
+        hour_starts = self._hour_edges()[:-1]
+        baseline_on = np.ones(len(hour_starts))
+        if baseline_hours is not None:
+            start, end = baseline_hours
+            hour_of_day = (hour_starts % DAY) // HOUR
+            inside = (hour_of_day >= start) & (hour_of_day < end) if end > start else \
+                (hour_of_day >= start) | (hour_of_day < end)
+            baseline_on = inside.astype(float)
+        rates = self.tariff.hourly_rates(hour_starts)
+        hourly = self._rollup(None, None)
+
+        result = {}
+        for row, appliance in enumerate(self.appliances):
+            kw = self.watts_for(appliance) / 1000.0
+            baseline_kwh = kw * baseline_on.sum()
+            baseline_cost = kw * float(baseline_on @ rates)
+            kwh, cost = float(hourly.kwh[row].sum()), float(hourly.cost[row].sum())
+            result[appliance] = {"kwh": kwh, "cost": cost, "baseline_kwh": baseline_kwh,
+                                 "saved_kwh": baseline_kwh - kwh, "saved_cost": baseline_cost - cost}
+        totals = {key: sum(entry[key] for entry in result.values())
+                  for key in ("kwh", "cost", "baseline_kwh", "saved_kwh", "saved_cost")}
+        return {"appliances": result, "total": totals,
+                "days": (self.end - self.start) / DAY}
+
+
+def synthetic_history(rooms=20, days=365, sessions_per_day=12, seed=0, start=datetime.date(2025, 1, 1)):
+    # Random non-overlapping ON sessions for every room's appliances, for benchmarks
+    rng = np.random.default_rng(seed)
+    base = int(_to_seconds(start.isoformat()))
+    appliances, starts, ends = [], [], []
+    for room in range(rooms):
+        for appliance in DEFAULT_WATTS:
+            count = days * sessions_per_day
+            gaps = rng.exponential(DAY / sessions_per_day / 2, count).astype(np.int64) + 60
+            lengths = rng.exponential(DAY / sessions_per_day / 2, count).astype(np.int64) + 60
+            session_starts = base + np.cumsum(gaps + lengths) - lengths
+            appliances.extend([f"room{room}:{appliance}"] * count)
+            starts.append(session_starts)
+            ends.append(session_starts + lengths)
+    return appliances, np.concatenate(starts), np.concatenate(ends)
@@ -0,0 +1,380 @@
+import csv
+import datetime
+import gzip
+import importlib.util
+import io
+import json
+import os
+import shutil
+import threading
+
+from logsink import CsvLogWriter
+
+CSV = "csv"
+CSV_GZIP = "csv.gz"
+CSV_ZSTD = "csv.zst"
+PARQUET = "parquet"
+
+COLUMNS = ("date", "time", "message")
+
+
+def available_formats():
+    # zstandard and pyarrow are only imported once a zstd or Parquet file is
+    # written: pyarrow alone costs hundreds of ms, and the daemon imports
+    # this module for LogRotator at startup
+    formats = [CSV, CSV_GZIP]
+    if importlib.util.find_spec("zstandard") is not None:
+        formats.append(CSV_ZSTD)
+    if importlib.util.find_spec("pyarrow") is not None:
+        formats.append(PARQUET)
+    return formats
+
+
+def format_for_path(path):
+    for fmt in (CSV_GZIP, CSV_ZSTD, PARQUET):
+        if path.endswith("." + fmt):
+            return fmt
+    return CSV
+
+
+def open_text(path, fmt, mode="w"):
+    # Text handle for CSV in any supported compression; "a" appends a new
+    # gzip member / zstd frame, which readers decode as one stream
+    if fmt == CSV:
+        return open(path, mode, newline='')
+    if fmt == CSV_GZIP:
+        return gzip.open(path, mode + "t", newline='', compresslevel=6)
+    if fmt == CSV_ZSTD:
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd output needs the optional 'zstandard' package") from None
+        raw = open(path, mode + "b")
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=3).stream_writer(raw), newline='')
+    raise ValueError(f"{fmt!r} is not a CSV format")
+
+
+class _CsvOutput:
+    def __init__(self, path, fmt):
+        self._file = open_text(path, fmt)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetOutput:
+    # One row group per chunk, so memory stays at one chunk regardless of range
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output needs the optional 'pyarrow' package") from None
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([(name, pyarrow.string()) for name in COLUMNS])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        pyarrow = self._pyarrow
+        self._writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, pyarrow.string()) for column in columns], schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _open_output(path, fmt):
+    if fmt == PARQUET:
+        return _ParquetOutput(path)
+    return _CsvOutput(path, fmt)
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def check_date_range(start=None, end=None):
+    # Blank bounds mean "all"; anything else must be YYYY-MM-DD with start <= end
+    bounds = []
+    for name, value in (("start", start), ("end", end)):
+        value = (value or "").strip() or None
+        if value is not None:
+            try:
+                value = datetime.date.fromisoformat(value).isoformat()
+            except ValueError:
+                raise ValueError(f"Invalid {name} date {value!r}; expected YYYY-MM-DD") from None
+        bounds.append(value)
+    if bounds[0] and bounds[1] and bounds[0] > bounds[1]:
+        raise ValueError(f"Start date {bounds[0]} is after end date {bounds[1]}")
+    return tuple(bounds)
+
+
+class ExportJob:
+    """Streams a slice of the LogStore to a file on a background thread.
+
+    Rows are read chunk_size at a time through LogStore.iter_query, so memory
+    use does not depend on the size of the range. The output is written to
+    a .part file and renamed when complete; progress(written, total) is
+    called after every chunk from the export thread.
+    """
+
+    def __init__(self, store, dest, start=None, end=None, appliances=None, fmt=None, chunk_size=5000,
+                 progress=None, done=None):
+        self.store = store
+        self.dest = dest
+        self.start_date, self.end_date = check_date_range(start, end)
+        self.appliances = appliances or None
+        self.fmt = fmt or format_for_path(dest)
+        if self.fmt not in available_formats():
+            raise ValueError(f"Export format {self.fmt!r} is not available; choose from {available_formats()}")
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.done = done
+
+        self.total = 0
+        self.written = 0
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="export", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def finished(self):
+        return self._thread is not None and not self._thread.is_alive()
+
+    def _run(self):
+        try:
+            self.run()
+        except Exception as exc:
+            self.error = exc
+        if self.done:
+            self.done(self)
+
+    def run(self):
+        self.total = self.store.count(self.start_date, self.end_date, self.appliances)
+        part = self.dest + ".part"
+        output = _open_output(part, self.fmt)
+        try:
+            chunk = []
+            for row in self.store.iter_query(self.start_date, self.end_date, self.appliances, self.chunk_size):
+                chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    self._write(output, chunk)
+                    chunk = []
+            if chunk:
+                self._write(output, chunk)
+            output.close()
+        except BaseException:
+            output.close()
+            os.remove(part)
+            raise
+        os.replace(part, self.dest)
+        return self.written
+
+    def _write(self, output, chunk):
+        if self._cancel.is_set():
+            raise ExportCancelled()
+        output.write(chunk)
+        self.written += len(chunk)
+        if self.progress:
+            self.progress(self.written, self.total)
+
+
+def archive_path(csv_path, month, fmt=CSV_GZIP, archive_dir=None):
+    base, _ = os.path.splitext(os.path.basename(csv_path))
+    directory = archive_dir or os.path.dirname(os.path.abspath(csv_path))
+    return os.path.join(directory, f"{base}-{month}.{fmt}")
+
+
+def _journal_path(csv_path):
+    return csv_path + ".rotate.json"
+
+
+def _needs_rotation(csv_path, cutoff):
+    # The active log is append-only and chronological: only the first row matters
+    try:
+        with open(csv_path, newline='') as file:
+            for row in csv.reader(file):
+                if row:
+                    return len(row) != 3 or row[0] < cutoff
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def rotate_csv(csv_path, keep_days=30, fmt=CSV_GZIP, archive_dir=None, sink=None, today=None):
+    """Moves rows older than keep_days out of the active CSV into monthly archives.
+
+    Archives are appended to, one per month (<log>-YYYY-MM.csv.gz); legacy
+    rows without a date go to <log>-undated. With a sink, its writers are
+    paused for the rewrite and reopen the new file on their next batch.
+    A rotation interrupted by a crash is finished first, without archiving
+    any row twice. Returns the number of rows archived.
+    """
+    cutoff = ((today or datetime.date.today()) - datetime.timedelta(days=keep_days)).isoformat()
+    if not os.path.exists(_journal_path(csv_path)) and not _needs_rotation(csv_path, cutoff):
+        return 0
+    if sink is None:
+        return _recover_and_rotate(csv_path, cutoff, fmt, archive_dir)
+    with sink.exclusive():
+        for writer in sink.writers:
+            if isinstance(writer, CsvLogWriter) and os.path.abspath(writer.path) == os.path.abspath(csv_path):
+                writer.close()
+        return _recover_and_rotate(csv_path, cutoff, fmt, archive_dir)
+
+
+def _recover_and_rotate(csv_path, cutoff, fmt, archive_dir):
+    archived = _recover(csv_path)
+    if _needs_rotation(csv_path, cutoff):
+        archived += _rotate(csv_path, cutoff, fmt, archive_dir)
+    return archived
+
+
+def _fsync(path):
+    with open(path, "rb") as file:
+        os.fsync(file.fileno())
+
+
+def _rotate(csv_path, cutoff, fmt, archive_dir):
+    """Splits the CSV in three steps that can be replayed after a crash.
+
+    1. Kept rows go to <log>.rotate and archived rows to one <archive>.pending
+       chunk per month; nothing existing is touched yet.
+    2. A journal records each archive's size before the append. Once it is
+       on disk the rotation is committed.
+    3. _recover() truncates every archive back to its recorded size, appends
+       its chunk (gzip members and zstd frames concatenate), replaces the CSV
+       and removes the journal. Replaying step 3 gives the same result.
+    """
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+    chunks = {}
+    archived = 0
+    tmp = csv_path + ".rotate"
+    try:
+        with open(csv_path, newline='') as source, open(tmp, "w", newline='') as active:
+            keep = csv.writer(active)
+            for row in csv.reader(source):
+                if not row:
+                    continue
+                if len(row) == 3 and row[0] >= cutoff:
+                    keep.writerow(row)
+                    continue
+                month = row[0][:7] if len(row) == 3 else "undated"
+                writer = chunks.get(month)
+                if writer is None:
+                    pending = archive_path(csv_path, month, fmt, archive_dir) + ".pending"
+                    handle = open_text(pending, fmt)
+                    writer = chunks[month] = (pending, handle, csv.writer(handle))
+                writer[2].writerow(row)
+                archived += 1
+            active.flush()
+            os.fsync(active.fileno())
+        for pending, handle, _ in chunks.values():
+            handle.close()
+            _fsync(pending)
+
+        journal = {"csv": tmp, "archived": archived, "archives": []}
+        for pending, _, _ in chunks.values():
+            archive = pending[:-len(".pending")]
+            size = os.path.getsize(archive) if os.path.exists(archive) else 0
+            journal["archives"].append({"path": archive, "pending": pending, "size": size})
+        with open(_journal_path(csv_path) + ".tmp", "w") as file:
+            json.dump(journal, file)
+            file.flush()
+            os.fsync(file.fileno())
+    except BaseException:
+        for pending, handle, _ in chunks.values():
+            handle.close()
+            if os.path.exists(pending):
+                os.remove(pending)
+        for path in (tmp, _journal_path(csv_path) + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    os.replace(_journal_path(csv_path) + ".tmp", _journal_path(csv_path))
+    return _recover(csv_path)
+
+
+def _recover(csv_path):
+    # Completes a committed rotation; returns the rows it archived (0 if none was pending)
+    journal_path = _journal_path(csv_path)
+    try:
+        with open(journal_path) as file:
+            journal = json.load(file)
+    except FileNotFoundError:
+        return 0
+    for entry in journal["archives"]:
+        if os.path.exists(entry["pending"]):
+            with open(entry["path"], "ab") as archive:
+                archive.truncate(entry["size"])
+                with open(entry["pending"], "rb") as chunk:
+                    shutil.copyfileobj(chunk, archive)
+                archive.flush()
+                os.fsync(archive.fileno())
+    if os.path.exists(journal["csv"]):
+        os.replace(journal["csv"], csv_path)
+    # Chunks go only after the CSV no longer holds their rows
+    for entry in journal["archives"]:
+        if os.path.exists(entry["pending"]):
+            os.remove(entry["pending"])
+    os.remove(journal_path)
+    return journal["archived"]
+
+
+class LogRotator:
+    """Rotates the active CSV log at start-up and then every `interval` seconds."""
+
+    def __init__(self, csv_path, sink=None, keep_days=30, interval=3600.0, fmt=CSV_GZIP, archive_dir=None,
+                 log=None):
+        self.csv_path = csv_path
+        self.sink = sink
+        self.keep_days = keep_days
+        self.interval = interval
+        self.fmt = fmt
+        self.archive_dir = archive_dir
+        self.log = log
+        self.archived = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-rotate", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def rotate(self):
+        try:
+            count = rotate_csv(self.csv_path, self.keep_days, self.fmt, self.archive_dir, self.sink)
+        except Exception:
+            self.errors += 1
+            return 0
+        self.archived += count
+        if count and self.log:
+            self.log(f"Archived {count} log rows older than {self.keep_days} days")
+        return count
+
+    def _run(self):
+        self.rotate()
+        while not self._stop.wait(self.interval):
+            self.rotate()
@@ -0,0 +1,183 @@
+import atexit
+import contextlib
+import csv
+import datetime
+import os
+import threading
+import time
+
+from metrics import LOG_ROWS, LOG_WRITE_SECONDS
+
+FSYNC_NEVER = "never"        # leave it to the OS page cache
+FSYNC_INTERVAL = "interval"  # fsync at most every fsync_interval seconds
+FSYNC_BATCH = "batch"        # fsync after every flushed batch
+
+
+def make_entry(message, timestamp=None):
+    timestamp = timestamp or datetime.datetime.now()
+    return [timestamp.strftime("%Y-%m-%d"), timestamp.strftime("%H:%M:%S"), message]
+
+
+class CsvLogWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._writer = None
+
+    def write_rows(self, rows):
+        if self._file is None:
+            self._file = open(self.path, "a", newline='')
+            self._writer = csv.writer(self._file)
+        self._writer.writerows(rows)
+
+    def flush(self, fsync=False):
+        if self._file is None:
+            return
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+
+class LogSink:
+    """Batches log rows in memory and writes them from a background thread.
+
+    A batch is flushed once it holds max_batch rows or its oldest row is
+    max_delay seconds old, so a process crash loses at most max_delay
+    seconds of events. The fsync policy bounds what a power loss can lose
+    on top of that.
+    """
+
+    def __init__(self, writers, max_batch=64, max_delay=1.0, fsync=FSYNC_INTERVAL, fsync_interval=5.0):
+        if fsync not in (FSYNC_NEVER, FSYNC_INTERVAL, FSYNC_BATCH):
+            raise ValueError(f"Unknown fsync policy {fsync!r}")
+        if isinstance(writers, str):
+            writers = [CsvLogWriter(writers)]
+        self.writers = list(writers)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._pending = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_requests = 0
+        self._flushed = 0
+        self._closed = False
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        self._io_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, message, timestamp=None):
+        entry = make_entry(message, timestamp)
+        self.write(entry)
+        return entry
+
+    def write(self, row):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("LogSink is closed")
+            first = not self._pending
+            if first:
+                self._oldest = time.monotonic()
+            self._pending.append(row)
+            # The first row starts the max_delay deadline, so the writer has to
+            # wake up and re-arm its wait; a full batch is due immediately
+            if first or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self, timeout=None):
+        # Blocks until everything logged before this call is on disk; False if
+        # the timeout ran out first (e.g. while a rotation holds the files)
+        with self._cond:
+            self._flush_requests += 1
+            ticket = self._flush_requests
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._flushed >= ticket or not self._thread.is_alive(), timeout)
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        # Flushes, then keeps the writer thread off the files (e.g. while the
+        # CSV is rotated); rows logged meanwhile are written afterwards
+        self.flush()
+        with self._io_lock:
+            yield
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        with self._io_lock, LOG_WRITE_SECONDS.time():
+            for writer in self.writers:
+                writer.close()
+        atexit.unregister(self.close)
+
+    def _next_deadline(self):
+        deadlines = []
+        if self._pending:
+            deadlines.append(self._oldest + self.max_delay)
+        if self._dirty and self.fsync == FSYNC_INTERVAL:
+            deadlines.append(self._last_fsync + self.fsync_interval)
+        return min(deadlines) if deadlines else None
+
+    def _due(self):
+        if self._closed or self._flush_requests > self._flushed:
+            return True
+        if len(self._pending) >= self.max_batch:
+            return True
+        deadline = self._next_deadline()
+        return deadline is not None and time.monotonic() >= deadline
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    deadline = self._next_deadline()
+                    self._cond.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+                batch, self._pending = self._pending, []
+                ticket = self._flush_requests
+                closing = self._closed
+
+            self._write_batch(batch, force_sync=closing or ticket > self._flushed)
+
+            with self._cond:
+                self._flushed = ticket
+                self._cond.notify_all()
+                if closing and not self._pending:
+                    return
+
+    def _write_batch(self, batch, force_sync=False):
+        now = time.monotonic()
+        sync = self.fsync == FSYNC_BATCH or (
+            self.fsync == FSYNC_INTERVAL and (force_sync or now - self._last_fsync >= self.fsync_interval))
+        with self._io_lock, LOG_WRITE_SECONDS.time():
+            for writer in self.writers:
+                try:
+                    if batch:
+                        writer.write_rows(batch)
+                    writer.flush(fsync=sync)
+                except Exception:
+                    self.errors += 1
+        if batch:
+            self._dirty = True
+            self.written += len(batch)
+            self.batches += 1
+            LOG_ROWS.inc(len(batch))
+        if sync:
+            self._last_fsync = now
+            self._dirty = False
@@ -0,0 +1,330 @@
+import csv
+import datetime
+import os
+import re
+import sqlite3
+import threading
+
+_EVENT_RE = re.compile(r"^(?P<appliance>.+?) turned (?P<event>ON|OFF)(?: after (?P<duration>\S+))?$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    time TEXT NOT NULL,
+    message TEXT NOT NULL,
+    appliance TEXT,
+    event TEXT,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS logs_by_date ON logs(date, time);
+CREATE INDEX IF NOT EXISTS logs_by_appliance ON logs(appliance, date, time);
+CREATE TABLE IF NOT EXISTS days (
+    date TEXT PRIMARY KEY,
+    entries INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    date TEXT NOT NULL,
+    appliance TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    sessions INTEGER NOT NULL,
+    PRIMARY KEY (date, appliance)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def default_store_path(log_file):
+    return os.path.splitext(log_file)[0] + ".db"
+
+
+def parse_duration(text):
+    # str(timedelta): "H:MM:SS[.ffffff]" or "N day(s), H:MM:SS[.ffffff]"
+    if not text or text == "None":
+        return None
+    days = 0
+    if "day" in text:
+        day_part, text = text.split(",", 1)
+        days = int(day_part.split()[0])
+    try:
+        hours, minutes, seconds = text.strip().split(":")
+        return days * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+def split_by_day(end, seconds):
+    # Spread a session ending at `end` over the calendar days it covered
+    start = end - datetime.timedelta(seconds=seconds)
+    parts = []
+    while start.date() < end.date():
+        midnight = datetime.datetime.combine(start.date() + datetime.timedelta(days=1), datetime.time())
+        parts.append((start.strftime("%Y-%m-%d"), (midnight - start).total_seconds()))
+        start = midnight
+    parts.append((end.strftime("%Y-%m-%d"), (end - start).total_seconds()))
+    return parts
+
+
+def parse_message(message):
+    match = _EVENT_RE.match(message)
+    if not match:
+        return None, None, None
+    return match.group("appliance"), match.group("event"), parse_duration(match.group("duration"))
+
+
+class LogStore:
+    """SQLite-backed activity log indexed by date and appliance.
+
+    Rows migrated from old CSV files that never recorded a date are kept
+    with date NULL; they show up in undated() but not in date-range queries.
+    """
+
+    def __init__(self, path="appliance_logs.db"):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        if not self._conn.execute("SELECT 1 FROM meta WHERE key = 'usage_rollup'").fetchone():
+            self.rebuild_usage()
+
+    # LogSink writer interface
+
+    def write_rows(self, rows):
+        with self._lock, self._conn:
+            self._insert(rows)
+
+    def flush(self, fsync=False):
+        if fsync:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _insert(self, rows):
+        records = []
+        per_day = {}
+        for row in rows:
+            if len(row) == 3:
+                date, time, message = row
+            elif len(row) == 2:
+                date, (time, message) = None, row
+            else:
+                continue
+            appliance, event, duration = parse_message(message)
+            records.append((date or None, time, message, appliance, event, duration))
+            if date:
+                per_day[date] = per_day.get(date, 0) + 1
+        self._conn.executemany(
+            "INSERT INTO logs (date, time, message, appliance, event, duration) VALUES (?, ?, ?, ?, ?, ?)",
+            records)
+        self._conn.executemany(
+            "INSERT INTO days (date, entries) VALUES (?, ?) "
+            "ON CONFLICT(date) DO UPDATE SET entries = entries + excluded.entries",
+            per_day.items())
+        self._add_usage(record for record in records if record[0] and record[4] == "OFF")
+        return len(records)
+
+    def _add_usage(self, off_records):
+        totals = {}
+        for date, time, _, appliance, _, duration in off_records:
+            # OFF without a duration means the appliance had no recorded start
+            if duration is None:
+                continue
+            end = datetime.datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M:%S")
+            for day, seconds in split_by_day(end, duration):
+                totals.setdefault((day, appliance), [0.0, 0])[0] += seconds
+            totals.setdefault((date, appliance), [0.0, 0])[1] += 1
+        self._conn.executemany(
+            "INSERT INTO usage (date, appliance, seconds, sessions) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(date, appliance) DO UPDATE SET "
+            "seconds = seconds + excluded.seconds, sessions = sessions + excluded.sessions",
+            [(day, appliance, seconds, sessions) for (day, appliance), (seconds, sessions) in totals.items()])
+
+    def rebuild_usage(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM usage")
+            cursor = self._conn.execute(
+                "SELECT date, time, message, appliance, event, duration FROM logs "
+                "WHERE date IS NOT NULL AND event = 'OFF' ORDER BY date, time, id")
+            while True:
+                chunk = cursor.fetchmany(5000)
+                if not chunk:
+                    break
+                self._add_usage(chunk)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('usage_rollup', '1')")
+
+    # Migration
+
+    def migrate_csv(self, csv_path, batch_size=5000):
+        key = "migrated:" + os.path.abspath(csv_path)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+            if not os.path.exists(csv_path):
+                with self._conn:
+                    self._conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, "0"))
+                return 0
+            migrated = 0
+            with self._conn, open(csv_path, "r", newline='') as file:
+                batch = []
+                for row in csv.reader(file):
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        migrated += self._insert(batch)
+                        batch = []
+                migrated += self._insert(batch)
+                self._conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(migrated)))
+            return migrated
+
+    # Queries
+
+    def dates(self, start=None, end=None, descending=False, limit=None):
+        sql, params = "SELECT date, entries FROM days", []
+        sql, params = self._date_range(sql, params, start, end, where=True)
+        sql += " ORDER BY date DESC" if descending else " ORDER BY date"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def query(self, start=None, end=None, appliances=None, limit=None, offset=0, descending=False):
+        sql, params = "SELECT date, time, message FROM logs WHERE date IS NOT NULL", []
+        sql, params = self._date_range(sql, params, start, end)
+        if appliances:
+            sql += " AND appliance IN (%s)" % ", ".join("?" * len(appliances))
+            params.extend(appliances)
+        order = "DESC" if descending else "ASC"
+        sql += f" ORDER BY date {order}, time {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def iter_query(self, start=None, end=None, appliances=None, chunk_size=5000):
+        # Keyset pagination keeps memory bounded for arbitrarily large ranges
+        last = None
+        while True:
+            sql, params = "SELECT id, date, time, message FROM logs WHERE date IS NOT NULL", []
+            sql, params = self._date_range(sql, params, start, end)
+            if appliances:
+                sql += " AND appliance IN (%s)" % ", ".join("?" * len(appliances))
+                params.extend(appliances)
+            if last is not None:
+                sql += " AND (date, time, id) > (?, ?, ?)"
+                params.extend(last)
+            sql += " ORDER BY date, time, id LIMIT ?"
+            params.append(chunk_size)
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+            if not rows:
+                return
+            for row_id, date, time, message in rows:
+                yield date, time, message
+            row_id, date, time, _ = rows[-1]
+            last = (date, time, row_id)
+
+    def events(self, start=None, end=None, appliances=None):
+        # (date, time, appliance, event, duration seconds) for ON/OFF rows only
+        sql, params = ("SELECT date, time, appliance, event, duration FROM logs "
+                       "WHERE date IS NOT NULL AND event IS NOT NULL"), []
+        sql, params = self._date_range(sql, params, start, end)
+        if appliances:
+            sql += " AND appliance IN (%s)" % ", ".join("?" * len(appliances))
+            params.extend(appliances)
+        sql += " ORDER BY date, time, id"
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def sessions(self, start=None, end=None):
+        # Column lists (end "YYYY-MM-DDTHH:MM:SS", duration seconds, appliance) of
+        # completed ON sessions. A day of slack on `end` keeps sessions that
+        # started inside the range but were switched off after midnight.
+        if end:
+            end = (datetime.date.fromisoformat(end) + datetime.timedelta(days=1)).isoformat()
+        sql, params = ("SELECT date || 'T' || time, duration, appliance FROM logs "
+                       "WHERE date IS NOT NULL AND event = 'OFF' AND duration IS NOT NULL"), []
+        sql, params = self._date_range(sql, params, start, end)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        if not rows:
+            return [], [], []
+        return tuple(map(list, zip(*rows)))
+
+    def open_sessions(self):
+        # {appliance: ON time} for appliances whose latest event is ON
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT appliance, date || 'T' || time, event FROM logs WHERE id IN ("
+                "SELECT MAX(id) FROM logs WHERE date IS NOT NULL AND event IS NOT NULL GROUP BY appliance)"
+            ).fetchall()
+        return {appliance: stamp for appliance, stamp, event in rows if event == "ON"}
+
+    def usage(self, start=None, end=None):
+        # {date: {appliance: seconds}} straight from the rollup table
+        sql, params = self._date_range("SELECT date, appliance, seconds FROM usage", [], start, end, where=True)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        result = {}
+        for date, appliance, seconds in rows:
+            result.setdefault(date, {})[appliance] = seconds
+        return result
+
+    def recent_usage(self, days=7):
+        with self._lock:
+            recent = self._conn.execute(
+                "SELECT DISTINCT date FROM usage ORDER BY date DESC LIMIT ?", (days,)).fetchall()
+        if not recent:
+            return {}
+        return self.usage(start=recent[-1][0], end=recent[0][0])
+
+    def undated(self, limit=None, offset=0):
+        sql, params = "SELECT time, message FROM logs WHERE date IS NULL ORDER BY id", []
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def count(self, start=None, end=None, appliances=None):
+        if appliances:
+            sql, params = "SELECT COUNT(*) FROM logs WHERE date IS NOT NULL", []
+            sql, params = self._date_range(sql, params, start, end)
+            sql += " AND appliance IN (%s)" % ", ".join("?" * len(appliances))
+            params.extend(appliances)
+            with self._lock:
+                return self._conn.execute(sql, params).fetchone()[0]
+        sql, params = self._date_range("SELECT COALESCE(SUM(entries), 0) FROM days", [], start, end, where=True)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def count_undated(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM logs WHERE date IS NULL").fetchone()[0]
+
+    def appliances(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT appliance FROM logs WHERE appliance IS NOT NULL").fetchall()
+        return sorted(row[0] for row in rows)
+
+    @staticmethod
+    def _date_range(sql, params, start, end, where=False):
+        clauses = []
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end)
+        if clauses:
+            sql += (" WHERE " if where else " AND ") + " AND ".join(clauses)
+        return sql, params
@@ -0,0 +1,81 @@
+import collections
+
+UNDATED = "(undated)"
+_PLACEHOLDER = "placeholder"
+_MORE = "more"
+
+
+class LiveFeed:
+    """Keeps only the newest max_rows entries in a Treeview (ring buffer)."""
+
+    def __init__(self, tree, max_rows=500):
+        self.tree = tree
+        self.max_rows = max_rows
+        self._items = collections.deque()
+
+    def add(self, values):
+        self._items.append(self.tree.insert("", "end", values=values))
+        while len(self._items) > self.max_rows:
+            self.tree.delete(self._items.popleft())
+
+
+class LazyLogTree:
+    """Populates a date -> entries Treeview from a LogStore on demand.
+
+    Only the day nodes are inserted up front. A day's entries are fetched
+    page by page when its node is expanded or its "load more" row is
+    selected, so opening the window costs one small query regardless of
+    how large the log is.
+    """
+
+    def __init__(self, tree, store, page_size=500):
+        self.tree = tree
+        self.store = store
+        self.page_size = page_size
+        self._loaded = {}
+        tree.bind("<<TreeviewOpen>>", self._on_open, add="+")
+        tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+
+    def populate(self):
+        self.tree.delete(*self.tree.get_children())
+        self._loaded = {}
+        for date, entries in self.store.dates(descending=True):
+            self._add_day(date, entries)
+        undated = self.store.count_undated()
+        if undated:
+            self._add_day(UNDATED, undated)
+
+    def _add_day(self, date, entries):
+        node = self.tree.insert("", "end", text=date, values=("", f"{entries} entries"), open=False)
+        self.tree.insert(node, "end", text="", values=("", "loading..."), tags=(_PLACEHOLDER,))
+        self._loaded[node] = 0
+
+    def _on_open(self, event):
+        node = self.tree.focus()
+        if node in self._loaded and self._loaded[node] == 0:
+            self.tree.delete(*self.tree.get_children(node))
+            self.load_page(node)
+
+    def _on_select(self, event):
+        for item in self.tree.selection():
+            if _MORE in self.tree.item(item, "tags"):
+                node = self.tree.parent(item)
+                self.tree.delete(item)
+                self.load_page(node)
+
+    def _fetch(self, date, offset):
+        if date == UNDATED:
+            return self.store.undated(limit=self.page_size + 1, offset=offset)
+        rows = self.store.query(start=date, end=date, limit=self.page_size + 1, offset=offset)
+        return [(time, message) for _, time, message in rows]
+
+    def load_page(self, node):
+        date = self.tree.item(node, "text")
+        offset = self._loaded[node]
+        rows = self._fetch(date, offset)
+        for time, message in rows[:self.page_size]:
+            self.tree.insert(node, "end", values=(time, message))
+        self._loaded[node] = offset + min(len(rows), self.page_size)
+        if len(rows) > self.page_size:
+            self.tree.insert(node, "end", values=("", f"load {self.page_size} more..."), tags=(_MORE,))
+        return len(rows[:self.page_size])
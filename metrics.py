@@ -0,0 +1,288 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; covers a sub-millisecond countNonZero up to a stalled camera read
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def items(self):
+        return list(self._children.items())
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _new_child = _CounterChild
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    _new_child = _GaugeChild
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name!r} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for values, child in metric.items():
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float("inf"),), child.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        labels = _format_labels(metric.label_names, values, [("le", le)])
+                        lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(metric.label_names, values)
+                    lines.append(f"{metric.name}_sum{labels} {child.sum}")
+                    lines.append(f"{metric.name}_count{labels} {child.count}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(metric.label_names, values)} {child.value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        # One line per series, for periodic dumps to a console or log file
+        lines = []
+        for metric in list(self._metrics.values()):
+            for values, child in metric.items():
+                series = metric.name + _format_labels(metric.label_names, values)
+                if metric.kind == "histogram":
+                    if child.count:
+                        lines.append(f"{series} n={child.count} mean={child.sum / child.count * 1000:.2f}ms "
+                                     f"p50={child.quantile(0.5) * 1000:.2f}ms p95={child.quantile(0.95) * 1000:.2f}ms")
+                else:
+                    lines.append(f"{series} {child.value:g}")
+        return lines
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "presence_stage_seconds", "Time spent in each hot-path stage", ("stage", "room"))
+FRAMES = REGISTRY.counter(
+    "presence_frames_total", "Frames that went through detection", ("room",))
+FRAMES_DROPPED = REGISTRY.counter(
+    "presence_frames_dropped_total", "Frames replaced before detection picked them up", ("room",))
+TARGET_FPS = REGISTRY.gauge(
+    "presence_target_fps", "Frame rate the adaptive scheduler currently asks for", ("room",))
+OCCUPIED = REGISTRY.gauge(
+    "presence_occupied", "1 while a room is occupied (appliances may stay on after it is left)", ("room",))
+APPLIANCE_ON = REGISTRY.gauge(
+    "presence_appliance_on", "1 while the appliance is on", ("room", "appliance"))
+TRANSITIONS = REGISTRY.counter(
+    "presence_appliance_transitions_total", "Appliance ON/OFF transitions", ("room", "appliance", "state"))
+LOG_ROWS = REGISTRY.counter(
+    "presence_log_rows_total", "Activity log rows written to disk")
+LOG_WRITE_SECONDS = REGISTRY.histogram(
+    "presence_log_write_seconds", "Time to write one batch of log rows to every writer")
+ACTUATION_SECONDS = REGISTRY.histogram(
+    "presence_actuation_seconds", "Round trip of one appliance command to its device")
+ACTUATION_COMMANDS = REGISTRY.counter(
+    "presence_actuation_commands_total", "Appliance commands by outcome (ok, retried, failed, coalesced)",
+    ("result",))
+
+
+def room_label(name):
+    return name if name is not None else "default"
+
+
+class MetricsServer:
+    """Serves GET /metrics from a registry on a local port."""
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9105):
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry_ref.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StatsDumper:
+    def __init__(self, registry=REGISTRY, interval=60.0, write=print):
+        self.registry = registry
+        self.interval = interval
+        self.write = write
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stats-dump", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            for line in self.registry.summary():
+                self.write(f"{stamp} {line}")
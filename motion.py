@@ -0,0 +1,125 @@
+import os
+
+import cv2
+import numpy as np
+
+
+class MotionDetector:
+    """MOG2 motion scoring that reuses its buffers between frames.
+
+    threshold is in foreground pixels at full resolution, like the original
+    `np.sum(fg_mask > 127) > 5000` check; it is rescaled when the subtractor
+    runs on a downscaled frame. With a grid the mask is counted block by
+    block and counting stops as soon as the threshold is crossed. Zones are
+    named (x, y, w, h) rectangles in full-resolution pixels.
+
+    OpenCV cannot serialise MOG2's per-pixel mixtures, so save_background()
+    stores the learned background image and load_background() replays it
+    into a fresh model before the first frame, which avoids the burst of
+    false motion a cold model produces after a restart.
+    """
+
+    def __init__(self, bg_subtractor=None, threshold=5000, scale=1.0, grid=None, zones=None):
+        self.bg_subtractor = bg_subtractor or cv2.createBackgroundSubtractorMOG2()
+        self.threshold = threshold
+        self.scale = scale
+        self.grid = grid
+        self.zones = zones or {}
+
+        self.last_count = 0
+        self.zone_scores = {}
+        self._shape = None
+        self._small = None
+        self._mask = None
+        self._binary = None
+        self._blocks = []
+        self._zone_slices = {}
+        self._scaled_threshold = threshold
+        self._warm_background = None
+        self.warm_frames = 20
+
+    def _prepare(self, shape):
+        h, w = shape[:2]
+        sw, sh = max(1, int(w * self.scale)), max(1, int(h * self.scale))
+        self._small = np.empty((sh, sw), dtype=np.uint8) if self.scale < 1.0 else None
+        self._mask = np.empty((sh, sw), dtype=np.uint8)
+        self._binary = np.empty((sh, sw), dtype=np.uint8)
+        self._scaled_threshold = self.threshold * (sw * sh) / float(w * h)
+
+        self._blocks = []
+        if self.grid:
+            rows, cols = self.grid
+            ys = np.linspace(0, sh, rows + 1).astype(int)
+            xs = np.linspace(0, sw, cols + 1).astype(int)
+            # Centre blocks first: people tend to be mid-frame, so the
+            # early exit usually triggers before the borders are counted.
+            order = sorted(((r, c) for r in range(rows) for c in range(cols)),
+                           key=lambda rc: abs(rc[0] - (rows - 1) / 2) + abs(rc[1] - (cols - 1) / 2))
+            for r, c in order:
+                self._blocks.append(self._binary[ys[r]:ys[r + 1], xs[c]:xs[c + 1]])
+
+        self._zone_slices = {}
+        ratio = sw / float(w)
+        for name, (x, y, zw, zh) in self.zones.items():
+            x0, y0 = int(x * ratio), int(y * ratio)
+            x1, y1 = max(x0 + 1, int((x + zw) * ratio)), max(y0 + 1, int((y + zh) * ratio))
+            self._zone_slices[name] = self._binary[y0:y1, x0:x1]
+        self._shape = shape
+
+    def save_background(self, path):
+        background = self.bg_subtractor.getBackgroundImage()
+        if background is None or self._shape is None:
+            return False
+        tmp = f"{path}.{os.getpid()}.tmp.png"
+        if not cv2.imwrite(tmp, background):
+            return False
+        os.replace(tmp, path)
+        return True
+
+    def load_background(self, path):
+        if not os.path.exists(path):
+            return False
+        self._warm_background = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        return self._warm_background is not None
+
+    def _warm_start(self):
+        background, self._warm_background = self._warm_background, None
+        # A model saved at another resolution or scale is useless; start cold
+        if background.shape != self._mask.shape:
+            return
+        self.bg_subtractor.apply(background, fgmask=self._mask, learningRate=1.0)
+        for _ in range(self.warm_frames):
+            self.bg_subtractor.apply(background, fgmask=self._mask)
+
+    def apply(self, gray):
+        if self._shape != gray.shape:
+            self._prepare(gray.shape)
+            if self._warm_background is not None:
+                self._warm_start()
+        if self._small is not None:
+            cv2.resize(gray, (self._small.shape[1], self._small.shape[0]), dst=self._small,
+                       interpolation=cv2.INTER_AREA)
+            gray = self._small
+
+        self.bg_subtractor.apply(gray, fgmask=self._mask)
+        # MOG2 marks shadows as 127; only count confident foreground (255)
+        cv2.threshold(self._mask, 127, 255, cv2.THRESH_BINARY, dst=self._binary)
+
+        if self.zones:
+            self.zone_scores = {name: cv2.countNonZero(view) / float(view.size)
+                                for name, view in self._zone_slices.items()}
+
+        if self._blocks:
+            count = 0
+            for block in self._blocks:
+                count += cv2.countNonZero(block)
+                if count > self._scaled_threshold:
+                    break
+        else:
+            count = cv2.countNonZero(self._binary)
+        self.last_count = count
+        return count > self._scaled_threshold
+
+    @property
+    def mask(self):
+        return self._binary
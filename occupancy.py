@@ -0,0 +1,169 @@
+import collections
+import time
+
+Transition = collections.namedtuple("Transition", ["kind", "appliance", "time"])
+
+# Transition kinds
+ENTERED = "entered"    # votes crossed the ON threshold (after debounce)
+LEFT = "left"          # votes fell to the OFF threshold; idle timers start
+WARNING = "warning"    # still vacant warning_after seconds after LEFT
+ON = "on"
+OFF = "off"
+
+_NO_EVENTS = ()
+
+
+class _VoteWindow:
+    # Ring buffer of one source's last `size` detections with a running count
+    __slots__ = ("votes", "index", "positives")
+
+    def __init__(self, size):
+        self.votes = [False] * size
+        self.index = 0
+        self.positives = 0
+
+    def vote(self, detected):
+        old = self.votes[self.index]
+        if old != detected:
+            self.votes[self.index] = detected
+            self.positives += 1 if detected else -1
+        self.index = (self.index + 1) % len(self.votes)
+        return self.positives
+
+
+class OccupancyStateMachine:
+    """Turns a per-frame detected/not-detected stream into occupancy transitions.
+
+    The last `window` frames vote: the room becomes occupied once at least
+    `votes_on` of them saw someone for `debounce` seconds, and only counts
+    as left again when the positives drop to `votes_off` or fewer
+    (hysteresis). After leaving, each appliance switches off after its own
+    timeout. update() returns an empty tuple unless something actually
+    changed.
+
+    Each source (camera) passed to update() votes in its own window, so a
+    camera that sees nobody cannot outvote one that sees someone: the room
+    is entered when any window reaches votes_on and left only when every
+    window is at votes_off or below. `positives` is the highest count.
+    """
+
+    def __init__(self, appliances, warning_after=10, off_after=15, timeouts=None, window=5, votes_on=3,
+                 votes_off=1, debounce=0.0, clock=time.monotonic):
+        if not 0 <= votes_off < votes_on <= window:
+            raise ValueError("need 0 <= votes_off < votes_on <= window")
+        self.warning_after = warning_after
+        self.timeouts = {appliance: off_after for appliance in appliances}
+        self.timeouts.update(timeouts or {})
+        self.window = window
+        self.votes_on = votes_on
+        self.votes_off = votes_off
+        self.debounce = debounce
+        self.clock = clock
+
+        self.present = False
+        self.appliances_on = {appliance: False for appliance in appliances}
+        self.left_at = None
+        self.changed_at = None
+        self.warned = False
+        self._windows = {}
+        self.positives = 0   # positive votes in the fullest source window
+        self._above_since = None
+        self._next_deadline = None
+
+    def _vote(self, detected, source):
+        window = self._windows.get(source)
+        if window is None:
+            window = self._windows[source] = _VoteWindow(self.window)
+        previous = window.positives
+        positives = window.vote(detected)
+        if positives > self.positives:
+            self.positives = positives
+        elif previous == self.positives and positives < previous:
+            # This source held the maximum; another one may still be above it
+            self.positives = max(w.positives for w in self._windows.values())
+        return self.positives
+
+    def update(self, detected, now=None, source=None):
+        now = self.clock() if now is None else now
+        positives = self._vote(bool(detected), source)
+
+        if not self.present:
+            if positives >= self.votes_on:
+                if self._above_since is None:
+                    self._above_since = now
+                if now - self._above_since >= self.debounce:
+                    return self._enter(now)
+            else:
+                self._above_since = None
+            if self._next_deadline is not None and now >= self._next_deadline:
+                return self._expire(now)
+            return _NO_EVENTS
+
+        if positives <= self.votes_off:
+            return self._leave(now)
+        return _NO_EVENTS
+
+    def _enter(self, now):
+        self.present = True
+        self.changed_at = now
+        self.left_at = None
+        self.warned = False
+        self._above_since = None
+        self._next_deadline = None
+        events = [Transition(ENTERED, None, now)]
+        for appliance, on in self.appliances_on.items():
+            if not on:
+                self.appliances_on[appliance] = True
+                events.append(Transition(ON, appliance, now))
+        return events
+
+    def _leave(self, now):
+        self.present = False
+        self.changed_at = now
+        self.left_at = now
+        self.warned = False
+        self._schedule()
+        return [Transition(LEFT, None, now)]
+
+    def _schedule(self):
+        if self.left_at is None:
+            self._next_deadline = None
+            return
+        deadlines = [self.left_at + self.timeouts[a] for a, on in self.appliances_on.items() if on]
+        if deadlines and not self.warned:
+            deadlines.append(self.left_at + self.warning_after)
+        self._next_deadline = min(deadlines) if deadlines else None
+
+    def _expire(self, now):
+        events = []
+        elapsed = now - self.left_at
+        if not self.warned and elapsed >= self.warning_after and any(self.appliances_on.values()):
+            self.warned = True
+            events.append(Transition(WARNING, None, now))
+        for appliance, on in self.appliances_on.items():
+            if on and elapsed >= self.timeouts[appliance]:
+                self.appliances_on[appliance] = False
+                events.append(Transition(OFF, appliance, now))
+        self._schedule()
+        return events
+
+    def set_appliance(self, appliance, on):
+        # Manual override from the UI: record the new state without an event
+        self.appliances_on[appliance] = on
+        self._schedule()
+
+    def reset(self, now=None):
+        # Forget presence and the vote window, e.g. after everything was
+        # switched off by hand; the next sustained detection enters again
+        # and turns the appliances back on
+        self.present = False
+        self.changed_at = self.clock() if now is None else now
+        self.left_at = None
+        self.warned = False
+        self._windows = {}
+        self.positives = 0
+        self._above_since = None
+        self._next_deadline = None
+
+    def all_off(self):
+        return not any(self.appliances_on.values())
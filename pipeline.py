@@ -0,0 +1,167 @@
+import threading
+import time
+import collections
+
+from metrics import STAGE_SECONDS, FRAMES_DROPPED, room_label
+from scheduler import Throttle
+
+
+class FpsCounter:
+    def __init__(self, window=2.0):
+        self.window = window
+        self._stamps = collections.deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.monotonic()
+        with self._lock:
+            self._stamps.append(now)
+            self._trim(now)
+
+    def _trim(self, now):
+        while self._stamps and now - self._stamps[0] > self.window:
+            self._stamps.popleft()
+
+    @property
+    def fps(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            if len(self._stamps) < 2:
+                return 0.0
+            span = self._stamps[-1] - self._stamps[0]
+            return (len(self._stamps) - 1) / span if span > 0 else 0.0
+
+
+class LatestQueue:
+    # Bounded to a single slot: a new item replaces the one nobody picked up yet
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._has_item = False
+        self.dropped = 0
+
+    def put(self, item):
+        # Returns True when an unconsumed item was replaced
+        with self._cond:
+            replaced = self._has_item
+            if replaced:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+            return replaced
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._has_item:
+                self._cond.wait(timeout)
+            if not self._has_item:
+                return None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+class FramePipeline:
+    """Capture -> detect -> display pipeline running off the Tk thread.
+
+    `source` is anything with a cv2.VideoCapture-style read(); `process` is
+    called on the detection worker with the newest frame and its return
+    value is handed to the UI via latest_result(). With a FrameScheduler
+    the capture loop only decodes frames at the scheduler's rate.
+    """
+
+    def __init__(self, source, process, idle_wait=0.05, room=None, scheduler=None):
+        self.source = source
+        self.process = process
+        self.idle_wait = idle_wait
+        self.scheduler = scheduler
+        self._capture_seconds = STAGE_SECONDS.labels("capture", room_label(room))
+        self._dropped = FRAMES_DROPPED.labels(room_label(room))
+
+        self.frames = LatestQueue()
+        self.results = LatestQueue()
+        self.capture_fps = FpsCounter()
+        self.detect_fps = FpsCounter()
+        self.display_fps = FpsCounter()
+        self.read_failures = 0
+
+        self._enabled = threading.Event()
+        self._enabled.set()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._detect_loop, name="detect", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        self._enabled.set()
+        self.frames.wake()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def pause(self):
+        self._enabled.clear()
+
+    def resume(self):
+        self._enabled.set()
+
+    @property
+    def running(self):
+        return self._enabled.is_set() and not self._stop.is_set()
+
+    def _capture_loop(self):
+        throttle = Throttle(self.scheduler, self._stop)
+        while not self._stop.is_set():
+            if not self._enabled.is_set():
+                self._enabled.wait()
+                continue
+            if not throttle.due(self.source):
+                continue
+            with self._capture_seconds.time():
+                ret, frame = self.source.read()
+            if not ret:
+                self.read_failures += 1
+                time.sleep(self.idle_wait)
+                continue
+            self.capture_fps.tick()
+            if self.frames.put(frame):
+                self._dropped.inc()
+
+    def _detect_loop(self):
+        while not self._stop.is_set():
+            frame = self.frames.get(timeout=self.idle_wait)
+            if frame is None:
+                continue
+            result = self.process(frame)
+            self.detect_fps.tick()
+            self.results.put(result)
+
+    def latest_result(self):
+        # The consumer ticks display_fps itself, since it may not render every result
+        return self.results.get_nowait()
+
+    def stats(self):
+        return {
+            "capture_fps": self.capture_fps.fps,
+            "detect_fps": self.detect_fps.fps,
+            "display_fps": self.display_fps.fps,
+            "dropped_frames": self.frames.dropped,
+            "dropped_results": self.results.dropped,
+            "read_failures": self.read_failures,
+        }
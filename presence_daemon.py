@@ -0,0 +1,189 @@
+import argparse
+import signal
+import sys
+import threading
+
+from rooms import RoomRegistry, PresenceEngine
+from logsink import LogSink, CsvLogWriter
+from logstore import LogStore, default_store_path
+from metrics import MetricsServer, StatsDumper
+from actuation import Actuator
+from export import LogRotator
+
+# Deliberately no tkinter, PIL, matplotlib or cv2 at import time. cv2 is
+# imported lazily: by the camera capture threads in this process once the
+# engine starts, and by the detection modules inside the worker processes.
+
+
+class PresenceController:
+    """Headless counterpart of PresenceGUI for boxes without a display."""
+
+    def __init__(self, log_file="appliance_logs.csv", workers=None, warning_after=10, off_after=15,
+                 fsync="interval", detector_options=None, room_options=None, background_dir=None,
+                 actuator=None, keep_days=30, schedule=None, batch_size=8):
+        self.log_file = log_file
+        self.log_store = LogStore(default_store_path(log_file))
+        self.log_store.migrate_csv(log_file)
+        self.log_sink = LogSink([CsvLogWriter(log_file), self.log_store], fsync=fsync)
+        self.log_rotator = LogRotator(log_file, self.log_sink, keep_days, log=print) if keep_days else None
+        self.warning_after = warning_after
+        self.off_after = off_after
+        self.room_options = room_options or {}
+        self.actuator = Actuator(actuator).start() if actuator else None
+        self.registry = RoomRegistry()
+        self.engine = PresenceEngine(self.registry, workers=workers, detector_options=detector_options,
+                                     batch_size=batch_size, background_dir=background_dir, schedule=schedule)
+        self._stop = threading.Event()
+
+    def add_camera(self, room, source, camera_id=None, detection_mode="balanced", detector="cascade"):
+        if room not in self.registry.rooms:
+            self.registry.add_room(room, warning_after=self.warning_after, off_after=self.off_after,
+                                   log=self.log_activity, on_change=self.on_appliance_change,
+                                   **self.room_options)
+        camera_id = camera_id or f"{room}-{len(self.registry.cameras_for(room))}"
+        return self.registry.add_camera(camera_id, source, room, detection_mode, detector)
+
+    def log_activity(self, message):
+        print(" ".join(self.log_sink.log(message)), flush=True)
+
+    def on_appliance_change(self, room, appliance, on):
+        if self.actuator:
+            self.actuator.set(room.label(appliance), on)
+
+    def run(self, stats_interval=0, metrics_port=0, metrics_dump=0):
+        metrics_server = dumper = None
+        try:
+            # Observability is optional: a port that is already taken must not
+            # stop the controller, and nothing may escape this try before the
+            # workers are started so shutdown() always runs
+            if metrics_port:
+                try:
+                    metrics_server = MetricsServer(port=metrics_port).start()
+                except OSError as exc:
+                    print(f"Metrics server disabled: cannot bind port {metrics_port}: {exc}",
+                          file=sys.stderr, flush=True)
+            if metrics_dump:
+                dumper = StatsDumper(interval=metrics_dump).start()
+            if self.log_rotator:
+                self.log_rotator.start()
+            self.engine.start()
+            while not self._stop.wait(stats_interval or 1.0) and not self.engine.stopped.is_set():
+                if stats_interval:
+                    self.print_stats()
+            if self.engine.failure is not None:
+                raise RuntimeError(f"Detection stopped: {self.engine.failure!r}")
+        finally:
+            if metrics_server:
+                metrics_server.stop()
+            if dumper:
+                dumper.stop()
+            self.shutdown()
+
+    def stop(self, *args):
+        self._stop.set()
+
+    def shutdown(self):
+        self.engine.stop()
+        for room in self.registry.rooms.values():
+            room.turn_off_appliances()
+        if self.actuator:
+            self.actuator.stop()
+        if self.log_rotator:
+            self.log_rotator.stop()
+        self.log_sink.close()
+        self.log_store.close()
+
+    def print_stats(self):
+        stats = self.engine.stats()
+        parts = [f"{cid}[{c['room']}] {c['detect_fps']:.1f}fps {c['status']}"
+                 + (f" {c['errors']} errors" if c["errors"] else "")
+                 for cid, c in stats["cameras"].items()]
+        print(f"aggregate {stats['aggregate_fps']:.1f}fps | " + " | ".join(parts), flush=True)
+
+
+def parse_camera(spec):
+    # ROOM=SOURCE, where SOURCE is a camera index, device path or stream URL
+    room, sep, source = spec.partition("=")
+    if not sep or not room or not source:
+        raise argparse.ArgumentTypeError(f"expected ROOM=SOURCE, got {spec!r}")
+    return room, int(source) if source.isdigit() else source
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless PRESENCE controller")
+    parser.add_argument("-c", "--camera", type=parse_camera, action="append", metavar="ROOM=SOURCE",
+                        help="map a camera to a room (repeatable, default: main=0)")
+    parser.add_argument("--log-file", default="appliance_logs.csv")
+    parser.add_argument("--fsync", choices=["never", "interval", "batch"], default="interval",
+                        help="when buffered log batches are fsynced to disk")
+    parser.add_argument("--keep-days", type=int, default=30,
+                        help="archive CSV rows older than this into monthly .csv.gz files (0 disables)")
+    parser.add_argument("--workers", type=int, default=0, help="detection processes (default: all cores)")
+    parser.add_argument("--mode", choices=("accurate", "balanced", "fast"), default="balanced",
+                        help="detection preset")
+    parser.add_argument("--detector", choices=["cascade", "hog", "dnn"], default="cascade",
+                        help="people detector backend (dnn needs --model)")
+    parser.add_argument("--model", help="ONNX person detector for --detector dnn")
+    parser.add_argument("--model-format", choices=["ssd", "yolov8"], default="ssd",
+                        help="output layout of the ONNX model")
+    parser.add_argument("--batch-size", type=int, default=8, help="frames per batched DNN inference")
+    parser.add_argument("--background-dir", default=".presence_state",
+                        help="save each camera's background model here for a warm restart ('' disables)")
+    parser.add_argument("--actuator", metavar="HOST:PORT",
+                        help="send appliance commands to this device gateway (see actuation.py)")
+    parser.add_argument("--fixed-rate", action="store_true",
+                        help="process every frame instead of adapting the rate to occupancy and load")
+    parser.add_argument("--active-fps", type=float, default=15.0, help="frame rate around occupancy changes")
+    parser.add_argument("--steady-fps", type=float, nargs=2, default=(1.0, 2.0), metavar=("OCCUPIED", "EMPTY"),
+                        help="frame rates once a room is steadily occupied / empty")
+    parser.add_argument("--cpu-budget", type=float, default=0.75,
+                        help="back off when host CPU load exceeds this fraction (0 disables)")
+    parser.add_argument("--warning-after", type=float, default=10)
+    parser.add_argument("--off-after", type=float, default=15)
+    parser.add_argument("--vote-window", type=int, default=5, help="frames that vote on occupancy")
+    parser.add_argument("--votes-on", type=int, default=3, help="positive votes needed to mark a room occupied")
+    parser.add_argument("--votes-off", type=int, default=1,
+                        help="a room counts as left once positive votes drop to this many")
+    parser.add_argument("--debounce", type=float, default=0.0,
+                        help="seconds the ON vote must hold before appliances switch on")
+    parser.add_argument("--stats-interval", type=float, default=0, help="print FPS/status every N seconds")
+    parser.add_argument("--metrics-port", type=int, default=9105,
+                        help="serve Prometheus metrics on 127.0.0.1:PORT/metrics (0 disables)")
+    parser.add_argument("--metrics-dump", type=float, default=0, help="print all metrics every N seconds")
+    args = parser.parse_args(argv)
+    if args.detector == "dnn" and not args.model:
+        parser.error("--detector dnn needs --model")
+
+    detector_options = {"dnn": {"model_path": args.model, "output_format": args.model_format}}
+    controller = PresenceController(
+        log_file=args.log_file,
+        workers=args.workers or None,
+        warning_after=args.warning_after,
+        off_after=args.off_after,
+        fsync=args.fsync,
+        detector_options=detector_options,
+        room_options={"window": args.vote_window, "votes_on": args.votes_on,
+                      "votes_off": args.votes_off, "debounce": args.debounce},
+        background_dir=args.background_dir or None,
+        actuator=args.actuator,
+        keep_days=args.keep_days,
+        schedule=None if args.fixed_rate else {
+            "active_fps": args.active_fps, "occupied_fps": args.steady_fps[0],
+            "empty_fps": args.steady_fps[1], "load_budget": args.cpu_budget},
+        batch_size=args.batch_size,
+    )
+    for room, source in args.camera or [("main", 0)]:
+        controller.add_camera(room, source, detection_mode=args.mode, detector=args.detector)
+
+    signal.signal(signal.SIGINT, controller.stop)
+    signal.signal(signal.SIGTERM, controller.stop)
+    try:
+        controller.run(args.stats_interval, args.metrics_port, args.metrics_dump)
+    except RuntimeError as exc:
+        print(f"presence_daemon: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,28 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import cv2
-from PIL import Image, ImageTk
-import threading
-import time
-import datetime
-import os
-import csv
+import collections
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+from pipeline import FramePipeline
+from detectors import create_detector
+from motion import MotionDetector
+from rooms import Room, OCCUPIED, WARNING, VACATED, IDLE
+from logsink import LogSink, CsvLogWriter
+from logstore import LogStore, default_store_path
+from logview import LiveFeed, LazyLogTree
+from display import PreviewRenderer
+from assets import AssetCache
+from actuation import Actuator
+from export import ExportJob, LogRotator, available_formats, check_date_range
+from energy import EnergyLedger, TariffSchedule
+from scheduler import FrameScheduler
+from metrics import STAGE_SECONDS, FRAMES, MetricsServer, StatsDumper, room_label
+
+Detection = collections.namedtuple("Detection", ["frame", "faces", "face_detected", "motion_detected"])
+
 class PresenceGUI:
     def __init__(self, root):
         self.root = root
@@ -24,30 +36,65 @@ class PresenceGUI:
         self.camera_enabled = True
         self.automation_enabled = True
 
-        self.appliance_states = {"LIGHTS": False, "AIRCON": False}
-        self.appliance_start_times = {}
-        self.daily_durations = {"LIGHTS": datetime.timedelta(), "AIRCON": datetime.timedelta()}
         self.log_file = "appliance_logs.csv"
+        self.live_feed_length = 500
+        self.flush_timeout = 0.5           # admin windows open with what is on disk rather than wait out a log rotation
+        self.preview_fps = 15
+        self.preview_scale = 1.0
+        self.metrics_port = None           # e.g. 9105 to serve http://127.0.0.1:9105/metrics
+        self.metrics_dump_interval = None  # seconds between metric dumps to stdout
+        self.actuator_address = None       # e.g. "127.0.0.1:9200" for a relay gateway or `python actuation.py`
+        self.actuator = Actuator(self.actuator_address).start() if self.actuator_address else None
+        self.log_store = LogStore(default_store_path(self.log_file))
+        self.log_store.migrate_csv(self.log_file)
+        self.log_sink = LogSink([CsvLogWriter(self.log_file), self.log_store])
+        self.appliance_watts = {"LIGHTS": 60, "AIRCON": 1000}
+        self.tariff = TariffSchedule(0.20)   # flat rate per kWh; add (start_hour, end_hour, rate) peak periods
+        self.currency = "USD"
+        self.log_keep_days = 30   # older rows move from the CSV into monthly .csv.gz archives
+        self.log_rotator = LogRotator(self.log_file, self.log_sink, keep_days=self.log_keep_days).start()
+        self.room = Room(log=self.log_activity, on_change=self.on_appliance_change)
+        self.shown_status = None
+        self.appliance_states = self.room.appliance_states
+        self.daily_durations = self.room.daily_durations
 
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         self.bg_subtractor = cv2.createBackgroundSubtractorMOG2()
+        self.motion_detector = MotionDetector(self.bg_subtractor)
+        self.background_file = "background_model.png"
+        self.motion_detector.load_background(self.background_file)
+        self.detection_mode = "balanced"
+        self.detector_backend = "cascade"   # "hog", or "dnn" with detector_options={"model_path": ...}
+        self.detector_options = {}
+        self.detector = create_detector(self.detector_backend, mode=self.detection_mode, **self.detector_options)
 
-        self.last_detection_time = None
-        self.warning_shown = False
         self.video_capture = cv2.VideoCapture(0)
 
+        self.assets = AssetCache()
         self.appliance_images = {
             "LIGHTS": {
-                True: ImageTk.PhotoImage(Image.open("light_on.png").resize((200, 180))),
-                False: ImageTk.PhotoImage(Image.open("light_off.png").resize((200, 180)))
+                True: self.assets.photo("light_on.png", (200, 180)),
+                False: self.assets.photo("light_off.png", (200, 180))
             },
             "AIRCON": {
-                True: ImageTk.PhotoImage(Image.open("aircon_on.png").resize((180, 200))),
-                False: ImageTk.PhotoImage(Image.open("aircon_off.png").resize((180, 200)))
+                True: self.assets.photo("aircon_on.png", (180, 200)),
+                False: self.assets.photo("aircon_off.png", (180, 200))
             }
         }
 
+        # Samples the camera at full rate around occupancy changes and slower once the room is steady
+        self.scheduler = FrameScheduler(self.room, active_fps=self.preview_fps)
+        self.pipeline = FramePipeline(self.video_capture, self.detect_frame, room=self.room.name,
+                                      scheduler=self.scheduler)
+        label = room_label(self.room.name)
+        self.motion_seconds = STAGE_SECONDS.labels("motion", label)
+        self.faces_seconds = STAGE_SECONDS.labels("faces", label)
+        self.frames_counter = FRAMES.labels(label)
+        self.metrics_server = MetricsServer(port=self.metrics_port).start() if self.metrics_port else None
+        self.stats_dumper = StatsDumper(interval=self.metrics_dump_interval).start() if self.metrics_dump_interval else None
+
         self.setup_gui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.pipeline.start()
         self.update_frame()
 
     def styled_button(self, parent, text, command=None, color="#f06292"):
@@ -60,9 +107,7 @@ class PresenceGUI:
         top_frame = tk.Frame(self.root, bg="gray")
         top_frame.pack(side="top", fill="x", pady=10, padx=10)
 
-        logo_image = Image.open("logo.png") 
-        logo_image = logo_image.resize((90, 50))
-        logo_tk = ImageTk.PhotoImage(logo_image)
+        logo_tk = self.assets.photo("logo.png", (90, 50))
 
         logo_label = tk.Label(top_frame, image=logo_tk, bg="grey")
         logo_label.image = logo_tk  
@@ -100,11 +145,17 @@ class PresenceGUI:
 
         self.camera_label = tk.Label(self.right_frame, bg="#fce4ec")
         self.camera_label.pack(pady=(5, 10))
+        self.preview = PreviewRenderer(self.camera_label, max_fps=self.preview_fps, scale=self.preview_scale,
+                                       room=self.room.name)
 
         self.warning_label = tk.Label(self.right_frame, text="", font=("Arial", 14, "bold"),
                                       fg="red", bg="#fce4ec")
         self.warning_label.pack(pady=10)
 
+        self.fps_label = tk.Label(self.right_frame, text="", font=("Arial", 10),
+                                  fg="black", bg="#fce4ec")
+        self.fps_label.pack(pady=(0, 5))
+
         bottom_frame = tk.Frame(self.root, bg="#fce4ec")
         bottom_frame.pack(side="bottom", fill="both", expand=True, padx=10, pady=10)
 
@@ -124,88 +175,95 @@ class PresenceGUI:
         self.tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side="right", fill="y")
         self.tree.pack(fill="both", expand=True)
+        self.live_feed = LiveFeed(self.tree, self.live_feed_length)
 
         self.admin_panel = tk.Frame(self.root, bg="#fce4ec")
 
+    def detect_frame(self, frame):
+        # Runs on the pipeline's detection worker, never on the Tk thread.
+        # Boxes stay in camera coordinates; the preview mirrors the frame.
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        with self.motion_seconds.time():
+            motion_detected = self.motion_detector.apply(gray)
+        with self.faces_seconds.time():
+            faces = self.detector.detect(frame if self.detector.needs_color else gray, motion=motion_detected)
+        self.frames_counter.inc()
+        return Detection(frame, faces, len(faces) > 0, motion_detected)
+
     def update_frame(self):
         if self.camera_enabled:
-            ret, frame = self.video_capture.read()
-            if ret:
-                frame = cv2.flip(frame, 1)
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-
-                fg_mask = self.bg_subtractor.apply(gray)
-                motion_detected = np.sum(fg_mask > 127) > 5000
-                face_detected = len(faces) > 0
-                detected = face_detected or motion_detected
-
-                if detected:
-                    self.last_detection_time = datetime.datetime.now()
-                    self.warning_shown = False
-                    self.status_label.config(text="✅ OCCUPIED", fg="green")
-                    self.warning_label.config(text="")
-                    for (x, y, w, h) in faces:
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 255), 2)
-                    self.turn_on_appliances()
-                else:
-                    if self.last_detection_time:
-                        elapsed = (datetime.datetime.now() - self.last_detection_time).total_seconds()
-                        if elapsed > 10 and not self.warning_shown:
-                            self.warning_label.config(text="⚠️ No detection. Turning off in 5s.")
-                            self.warning_shown = True
-                        if elapsed > 15:
-                            self.turn_off_appliances()
-                            self.status_label.config(text="❌ UNOCCUPIED", fg="red")
-                            self.warning_label.config(text="")
-                            self.last_detection_time = None
-                    else:
+            result = self.pipeline.latest_result()
+            if result is not None:
+                frame, faces = result.frame, result.faces
+                detected = result.face_detected or result.motion_detected
+
+                status = self.room.update(detected)
+                if status != self.shown_status:
+                    # Labels only change on real transitions, not on every frame
+                    self.shown_status = status
+                    if status == OCCUPIED:
+                        self.status_label.config(text="✅ OCCUPIED", fg="green")
+                        self.warning_label.config(text="")
+                    elif status == WARNING:
+                        remaining = self.room.off_after - self.room.warning_after
+                        self.warning_label.config(text=f"⚠️ No detection. Turning off in {remaining:g}s.")
+                    elif status == VACATED:
+                        self.status_label.config(text="❌ UNOCCUPIED", fg="red")
+                        self.warning_label.config(text="")
+                    elif status == IDLE:
                         self.status_label.config(text="🔍 DETECTING...", fg="gray")
 
-                img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(img)
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.camera_label.imgtk = imgtk
-                self.camera_label.configure(image=imgtk)
+                if self.preview.due():
+                    if status == OCCUPIED:
+                        for (x, y, w, h) in faces:
+                            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 255), 2)
+                    self.preview.render(frame)
+                    self.pipeline.display_fps.tick()
+                    self.update_fps_label()
         else:
-            blank = Image.new("RGB", (640, 480), "black")
-            imgtk = ImageTk.PhotoImage(image=blank)
-            self.camera_label.imgtk = imgtk
-            self.camera_label.configure(image=imgtk)
-
-        self.root.after(10, self.update_frame)
+            self.preview.render_blank()
+
+        # Poll twice per scheduled frame: no sooner, since nothing new can arrive
+        delay = int(500 / self.scheduler.fps) if self.camera_enabled else 100
+        self.root.after(max(10, min(delay, 250)), self.update_frame)
+
+    def update_fps_label(self):
+        stats = self.pipeline.stats()
+        self.fps_label.config(text="capture {:.1f} fps | detect {:.1f} fps | display {:.1f} fps | dropped {}".format(
+            stats["capture_fps"], stats["detect_fps"], stats["display_fps"], stats["dropped_frames"]))
+
+    def on_close(self):
+        self.pipeline.stop()
+        self.motion_detector.save_background(self.background_file)
+        self.video_capture.release()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.stats_dumper:
+            self.stats_dumper.stop()
+        if self.actuator:
+            self.actuator.stop()
+        self.log_rotator.stop()
+        self.log_sink.close()
+        self.log_store.close()
+        self.root.destroy()
 
     def log_activity(self, message):
-        timestamp = datetime.datetime.now()
-        time_str = timestamp.strftime("%H:%M:%S")
-        date_str = timestamp.strftime("%Y-%m-%d")
-        log_entry = [date_str, time_str, message]
-    
-        self.tree.insert("", "end", values=(time_str, message))
-    
-        with open(self.log_file, "a", newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(log_entry)
+        date_str, time_str, message = self.log_sink.log(message)
+        self.live_feed.add((time_str, message))
 
 
     def turn_on_appliances(self):
-        for appliance in self.appliance_states:
-            if not self.appliance_states[appliance]:
-                self.appliance_states[appliance] = True
-                self.appliance_start_times[appliance] = datetime.datetime.now()
-                self.appliance_icons[appliance].configure(image=self.appliance_images[appliance][True])
-                self.log_activity(f"{appliance} turned ON")
+        self.room.turn_on_appliances()
 
     def turn_off_appliances(self):
-        for appliance in self.appliance_states:
-            if self.appliance_states[appliance]:
-                start_time = self.appliance_start_times.get(appliance)
-                if start_time:
-                    duration = datetime.datetime.now() - start_time
-                    self.daily_durations[appliance] += duration
-                self.appliance_states[appliance] = False
-                self.appliance_icons[appliance].configure(image=self.appliance_images[appliance][False])
-                self.log_activity(f"{appliance} turned OFF after {duration}")
+        self.room.turn_off_appliances()
+
+    def on_appliance_change(self, room, appliance, on):
+        # Device commands go out on the actuator's own loop; this never blocks the Tk thread
+        if self.actuator:
+            self.actuator.set(room.label(appliance), on)
+        self.appliance_icons[appliance].configure(image=self.appliance_images[appliance][on])
 
     def reset_to_home(self):
         self.admin_logged_in = False
@@ -302,60 +360,39 @@ class PresenceGUI:
         hsb.pack(side="bottom", fill="x")
         tree.configure(xscrollcommand=hsb.set)
 
-    # Load logs if file exists
-        if os.path.exists(self.log_file):
-            with open(self.log_file, 'r') as file:
-                reader = csv.reader(file)
-                logs_by_date = {}
-                for row in reader:
-                    if len(row) == 3:
-                        date, time, message = row
-                        logs_by_date.setdefault(date, []).append((time, message))
-
-                for date, entries in sorted(logs_by_date.items(), reverse=True):
-                    parent = tree.insert("", "end", text=date, open=False)  # collapsed by default
-                    for time, msg in entries:
-                        tree.insert(parent, "end", values=(time, msg))
+    # Day nodes load their entries from the store only when expanded
+        self.log_sink.flush(self.flush_timeout)
+        log_win.log_tree = LazyLogTree(tree, self.log_store)
+        log_win.log_tree.populate()
 
 
     def view_summary_graph(self):
-        if not os.path.exists(self.log_file):
+        self.log_sink.flush(self.flush_timeout)
+        usage_by_day = self.log_store.recent_usage(days=7)
+        if not usage_by_day:
             messagebox.showinfo("Summary", "No logs found.")
             return
 
-        appliance_data = {}
-        ongoing = {}
-
-    # Parse the log file and accumulate usage durations
-        with open(self.log_file, 'r') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                if len(row) == 3:
-                    date_str, time_str, message = row
-                    dt = datetime.datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M:%S")
-                    if "turned ON" in message:
-                        appliance = message.split(" turned ON")[0]
-                        ongoing[appliance] = dt
-                    elif "turned OFF" in message:
-                        appliance = message.split(" turned OFF")[0]
-                        start_time = ongoing.pop(appliance, None)
-                        if start_time:
-                            duration = dt - start_time
-                            day_data = appliance_data.setdefault(date_str, {})
-                            day_data[appliance] = day_data.get(appliance, datetime.timedelta()) + duration
-
-    # Get last 7 days
-        last_7_days = sorted(appliance_data.keys(), reverse=True)[:7]
+    # Last 7 days with any usage, from the store's rollup table
+        last_7_days = sorted(usage_by_day, reverse=True)[:7]
         last_7_days.reverse()
 
-        appliances = sorted({a for d in appliance_data.values() for a in d})
-        usage_matrix = []
-        for appliance in appliances:
-            daily_usage = []
-            for day in last_7_days:
-                usage = appliance_data.get(day, {}).get(appliance, datetime.timedelta())
-                daily_usage.append(usage.total_seconds() / 60)  # minutes
-            usage_matrix.append(daily_usage)
+        appliances = sorted({appliance for usage in usage_by_day.values() for appliance in usage})
+        minutes = np.array([[usage_by_day.get(day, {}).get(appliance, 0.0) for day in last_7_days]
+                            for appliance in appliances]) / 60
+        usage_matrix = list(minutes)
+
+    # kWh and cost (which depend on the time of day) come from the ON sessions in the same days
+        ledger = EnergyLedger.from_store(self.log_store, start=last_7_days[0], end=last_7_days[-1],
+                                         watts=self.appliance_watts, tariff=self.tariff)
+        daily = ledger.daily()
+        columns = [daily.periods.index(day) for day in last_7_days]
+        kwh = np.zeros_like(minutes)
+        cost = np.zeros_like(minutes)
+        for row, appliance in enumerate(appliances):
+            if appliance in daily.appliances:
+                kwh[row] = daily.kwh[daily.appliances.index(appliance), columns]
+                cost[row] = daily.cost[daily.appliances.index(appliance), columns]
 
     # Plotting
         fig, ax = plt.subplots(figsize=(10, 5))
@@ -373,17 +410,24 @@ class PresenceGUI:
 
     # Summary text
         summary_lines = []
-        for day in last_7_days:
+        for col, day in enumerate(last_7_days):
             summary_lines.append(f"\n{day}:")
-            for appliance in appliances:
-                usage = appliance_data.get(day, {}).get(appliance, datetime.timedelta())
-                if usage.total_seconds() > 0:
-                    hrs, rem = divmod(usage.total_seconds(), 3600)
+            for row, appliance in enumerate(appliances):
+                seconds = minutes[row, col] * 60
+                if seconds > 0:
+                    hrs, rem = divmod(seconds, 3600)
                     mins, secs = divmod(rem, 60)
                     summary_lines.append(
                         f"  • {appliance} ON for {int(hrs)} hr {int(mins)} min {int(secs)} sec"
+                        f" — {kwh[row, col]:.2f} kWh, {cost[row, col]:.2f} {self.currency}"
                     )
 
+        savings = ledger.savings()["total"]
+        summary_lines.append(
+            f"\nSince {last_7_days[0]}: {savings['kwh']:.2f} kWh ({savings['cost']:.2f} {self.currency}); "
+            f"saved {savings['saved_kwh']:.2f} kWh ({savings['saved_cost']:.2f} {self.currency}) "
+            f"versus leaving everything on")
+
         summary_text = "\n".join(summary_lines)
 
     # Tkinter window
@@ -423,26 +467,75 @@ class PresenceGUI:
 
 
     def export_logs(self, date=None):
-        if not os.path.exists(self.log_file):
-            messagebox.showinfo("Export", "No log file to export.")
-            return
-    
-    # Ask user where to save
-        dest = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV Files", "*.csv")])
-        if not dest:
+        self.log_sink.flush(self.flush_timeout)
+        if not self.log_store.count(date, date):
+            messagebox.showinfo("Export", "No logs to export.")
             return
-    
-        with open(self.log_file, "r") as src, open(dest, "w", newline="") as out:
-            writer = csv.writer(out)
-            reader = csv.reader(src)
 
-            for row in reader:
-                if len(row) == 3:
-                    row_date, time, msg = row
-                    if date is None or row_date == date:
-                        writer.writerow(row)
+        win = tk.Toplevel(self.root)
+        win.title("Export Logs")
+        win.resizable(False, False)
+
+        start_var = tk.StringVar(value=date or "")
+        end_var = tk.StringVar(value=date or "")
+        formats = available_formats()
+        format_var = tk.StringVar(value="csv")
+
+        tk.Label(win, text="From (YYYY-MM-DD, blank = all)").grid(row=0, column=0, sticky="w", padx=10, pady=5)
+        tk.Entry(win, textvariable=start_var).grid(row=0, column=1, padx=10, pady=5)
+        tk.Label(win, text="To (YYYY-MM-DD, blank = all)").grid(row=1, column=0, sticky="w", padx=10, pady=5)
+        tk.Entry(win, textvariable=end_var).grid(row=1, column=1, padx=10, pady=5)
+
+        tk.Label(win, text="Appliances (none selected = all)").grid(row=2, column=0, sticky="nw", padx=10, pady=5)
+        appliance_list = tk.Listbox(win, selectmode="multiple", height=5, exportselection=False)
+        for appliance in self.log_store.appliances():
+            appliance_list.insert("end", appliance)
+        appliance_list.grid(row=2, column=1, padx=10, pady=5)
+
+        tk.Label(win, text="Format").grid(row=3, column=0, sticky="w", padx=10, pady=5)
+        ttk.Combobox(win, textvariable=format_var, values=formats, state="readonly").grid(row=3, column=1, padx=10, pady=5)
+
+        progress = ttk.Progressbar(win, length=300, mode="determinate")
+        progress.grid(row=4, column=0, columnspan=2, padx=10, pady=5)
+        status = tk.Label(win, text="")
+        status.grid(row=5, column=0, columnspan=2, padx=10)
+
+        def start_export():
+            try:
+                start, end = check_date_range(start_var.get(), end_var.get())
+            except ValueError as exc:
+                messagebox.showerror("Export", str(exc), parent=win)
+                return
+            fmt = format_var.get()
+            dest = filedialog.asksaveasfilename(parent=win, defaultextension="." + fmt,
+                                                filetypes=[(fmt.upper(), "*." + fmt)])
+            if not dest:
+                return
+            appliances = [appliance_list.get(i) for i in appliance_list.curselection()]
+            job = ExportJob(self.log_store, dest, start, end, appliances, fmt)
+            export_btn.config(state="disabled")
+            job.start()
+            poll(job)
+
+        def poll(job):
+            # The export thread never touches Tk; progress is read from here
+            if not win.winfo_exists():
+                job.cancel()
+                return
+            if job.total:
+                progress["value"] = 100.0 * job.written / job.total
+            status.config(text=f"{job.written:,} / {job.total:,} rows")
+            if not job.finished:
+                win.after(100, poll, job)
+                return
+            export_btn.config(state="normal")
+            if job.error:
+                messagebox.showerror("Export", f"Export failed: {job.error}", parent=win)
+            else:
+                messagebox.showinfo("Export", f"Exported {job.written:,} rows.", parent=win)
 
-        messagebox.showinfo("Export", "Logs exported successfully!")
+        export_btn = self.styled_button(win, "Export", command=start_export)
+        export_btn.grid(row=6, column=0, columnspan=2, pady=10)
 
 
     def logout_admin(self):
@@ -464,6 +557,10 @@ class PresenceGUI:
 
     def toggle_automation(self):
         self.camera_enabled = not self.camera_enabled
+        if self.camera_enabled:
+            self.pipeline.resume()
+        else:
+            self.pipeline.pause()
         self.automation_btn.config(text="Turn On Automation" if not self.camera_enabled else "Turn Off Automation")
         if not self.camera_enabled:
             self.turn_off_appliances()
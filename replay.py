@@ -0,0 +1,290 @@
+import argparse
+import csv
+import json
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from detection import DETECTION_PRESETS
+from detectors import create_detector
+from motion import MotionDetector
+from rooms import Room
+
+STAGES = ("convert", "motion", "faces", "occupancy", "total")
+
+
+class VideoFileSource:
+    # Re-iterable: every pass reopens the file from the start
+    def __init__(self, path, fps=None):
+        self.path = path
+        if fps is None:
+            capture = cv2.VideoCapture(path)
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            capture.release()
+        self.fps = fps or 30.0
+
+    def __iter__(self):
+        capture = cv2.VideoCapture(self.path)
+        index = 0
+        try:
+            while True:
+                ret, frame = capture.read()
+                if not ret:
+                    return
+                yield index / self.fps, frame
+                index += 1
+        finally:
+            capture.release()
+
+
+class SyntheticSource:
+    """Noisy static background with a moving blob during the occupied spans."""
+
+    def __init__(self, width=640, height=480, seconds=60.0, fps=15.0, occupied=((10.0, 30.0),), seed=0):
+        self.width = width
+        self.height = height
+        self.seconds = seconds
+        self.fps = fps
+        self.occupied = list(occupied)
+        self.seed = seed
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed)
+        background = rng.integers(60, 120, (self.height, self.width, 3), dtype=np.uint8)
+        frame = np.empty_like(background)
+        noise = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        box_w, box_h = self.width // 6, self.height // 2
+        for index in range(int(self.seconds * self.fps)):
+            t = index / self.fps
+            np.copyto(frame, background)
+            noise[:] = rng.integers(0, 6, noise.shape, dtype=np.uint8)
+            frame += noise
+            if label_at(self.occupied, t):
+                x = int((np.sin(t) + 1) / 2 * (self.width - box_w))
+                y = self.height // 4
+                frame[y:y + box_h, x:x + box_w] = (200, 180, 160)
+            yield t, frame
+
+
+def synthetic_frames(width, height, count, seed=0):
+    # Grayscale frames with a blob sweeping across, for throughput benchmarks
+    source = SyntheticSource(width, height, seconds=count / 15.0, fps=15.0, occupied=[(0, count)], seed=seed)
+    for _, frame in source:
+        yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def load_labels(path):
+    # CSV rows of start_seconds,end_seconds for each occupied span; '#' lines are comments
+    spans = []
+    with open(path, newline='') as file:
+        for row in csv.reader(file):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                spans.append((float(row[0]), float(row[1])))
+            except ValueError:
+                continue
+    return spans
+
+
+def label_at(spans, t):
+    return any(start <= t < end for start, end in spans)
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(values.max())}
+
+
+def _run(source, labels, detection_mode, warning_after, off_after, motion_options, room_options, detector,
+         detector_options, timed=True):
+    motion_detector = MotionDetector(**(motion_options or {}))
+    # Built exactly as the engine's workers build it, so hog/dnn replay the live path too
+    backend = create_detector(detector, mode=detection_mode, **detector_options)
+    clock = [0.0]
+    transitions = []
+    room = Room(clock=lambda: clock[0], warning_after=warning_after, off_after=off_after,
+                on_change=lambda room, appliance, on: transitions.append((clock[0], appliance, on)),
+                **(room_options or {}))
+
+    timings = {stage: [] for stage in STAGES}
+    confusion = {"tp": 0, "fp": 0, "tn": 0, "fn": 0}
+    raw_hits = 0
+    hold_off = 0
+    frames = 0
+
+    wall_start = time.perf_counter()
+    for t, frame in source:
+        clock[0] = t
+        t0 = time.perf_counter()
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        t1 = time.perf_counter()
+        motion = motion_detector.apply(gray)
+        t2 = time.perf_counter()
+        faces = backend.detect(frame if backend.needs_color else gray, motion=motion)
+        t3 = time.perf_counter()
+        detected = len(faces) > 0 or motion
+        room.update(detected)
+        t4 = time.perf_counter()
+
+        if timed:
+            timings["convert"].append(t1 - t0)
+            timings["motion"].append(t2 - t1)
+            timings["faces"].append(t3 - t2)
+            timings["occupancy"].append(t4 - t3)
+            timings["total"].append(t4 - t0)
+        frames += 1
+        raw_hits += detected
+
+        # Score the occupancy decision itself. Appliances staying on after
+        # people leave is the intended off_after hold-off, not an error,
+        # so it is only counted separately.
+        present = room.occupancy.present
+        if not present and any(room.appliance_states.values()):
+            hold_off += 1
+        if labels is not None:
+            actual = label_at(labels, t)
+            key = ("t" if present == actual else "f") + ("p" if present else "n")
+            confusion[key] += 1
+    wall = time.perf_counter() - wall_start
+    return {"frames": frames, "wall": wall, "media_seconds": clock[0], "timings": timings,
+            "confusion": confusion, "raw_hits": raw_hits, "hold_off": hold_off,
+            "transitions": len(transitions),
+            "face_detector": dict(backend.face_detector.stats) if hasattr(backend, "face_detector") else {}}
+
+
+def replay(source, labels=None, detection_mode="balanced", warning_after=10, off_after=15,
+           motion_options=None, cascade=None, room_options=None, measure_memory=True, detector="cascade",
+           detector_options=None):
+    """Feed frames through the same detector + MOG2 + Room logic as the live app.
+
+    detector names a backend from detectors.BACKENDS and detector_options
+    are its constructor options (e.g. {"model_path": "person.onnx"} for dnn);
+    cascade overrides the Haar cascade of the default backend.
+
+    Frames carry their own timestamps, which drive the Room's idle timers,
+    so a recording replays as fast as the CPU allows. Latency is measured
+    on a plain pass; peak memory comes from a second pass under
+    tracemalloc, whose tracing overhead would otherwise skew the timings.
+    """
+    detector_options = dict(detector_options or {})
+    if cascade is not None and detector == "cascade":
+        detector_options["cascade"] = cascade
+    options = (labels, detection_mode, warning_after, off_after, motion_options, room_options, detector,
+               detector_options)
+    result = _run(source, *options)
+
+    peak_python = None
+    if measure_memory:
+        tracemalloc.start()
+        _run(source, *options, timed=False)
+        _, peak_python = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    frames, wall = result["frames"], result["wall"]
+    report = {
+        "frames": frames,
+        "wall_seconds": wall,
+        "fps": frames / wall if wall else 0.0,
+        "media_seconds": result["media_seconds"],
+        "realtime_factor": result["media_seconds"] / wall if wall else 0.0,
+        "latency_ms": {stage: percentiles(samples) for stage, samples in result["timings"].items()},
+        "peak_python_bytes": peak_python,
+        "peak_rss_kb": _peak_rss_kb(),
+        "detection_rate": result["raw_hits"] / frames if frames else 0.0,
+        "hold_off_frames": result["hold_off"],
+        "transitions": result["transitions"],
+        "face_detector": result["face_detector"],
+    }
+    if labels is not None:
+        confusion = result["confusion"]
+        tp, fp, tn, fn = confusion["tp"], confusion["fp"], confusion["tn"], confusion["fn"]
+        report["accuracy"] = {
+            "accuracy": (tp + tn) / frames if frames else 0.0,
+            "precision": tp / (tp + fp) if tp + fp else 1.0,
+            "recall": tp / (tp + fn) if tp + fn else 1.0,
+            "false_occupied_frames": fp,
+            "missed_frames": fn,
+        }
+    return report
+
+
+def _peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def print_report(report):
+    print(f"{report['frames']} frames in {report['wall_seconds']:.2f}s "
+          f"({report['fps']:.1f} fps, {report['realtime_factor']:.1f}x real time)")
+    print(f"{'stage':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for stage, stats in report["latency_ms"].items():
+        print(f"{stage:<12}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}{stats['max']:>9.2f}")
+    if report["peak_python_bytes"] is not None:
+        print(f"peak python alloc {report['peak_python_bytes']:,} B (separate pass), "
+              f"peak RSS {report['peak_rss_kb']} kB")
+    print(f"detection rate {report['detection_rate']:.1%}, {report['transitions']} appliance transitions, "
+          f"{report['hold_off_frames']} frames in the off_after hold-off")
+    if "accuracy" in report:
+        acc = report["accuracy"]
+        print(f"occupancy accuracy {acc['accuracy']:.1%}  precision {acc['precision']:.1%}  "
+              f"recall {acc['recall']:.1%}  false occupied {acc['false_occupied_frames']}  "
+              f"missed {acc['missed_frames']} frames")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic footage through the detection path")
+    parser.add_argument("video", nargs="?", help="video file (omit with --synthetic)")
+    parser.add_argument("--synthetic", action="store_true", help="use generated frames with known occupancy")
+    parser.add_argument("--labels", help="CSV of occupied spans: start_seconds,end_seconds")
+    parser.add_argument("--mode", choices=tuple(DETECTION_PRESETS), default="balanced", help="detection preset")
+    parser.add_argument("--detector", choices=["cascade", "hog", "dnn"], default="cascade",
+                        help="people detector backend (dnn needs --model)")
+    parser.add_argument("--model", help="ONNX person detector for --detector dnn")
+    parser.add_argument("--model-format", choices=["ssd", "yolov8"], default="ssd",
+                        help="output layout of the ONNX model")
+    parser.add_argument("--fps", type=float, help="override the source frame rate")
+    parser.add_argument("--warning-after", type=float, default=10)
+    parser.add_argument("--off-after", type=float, default=15)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--no-memory", action="store_true", help="skip the second, tracemalloc-traced pass")
+    parser.add_argument("--min-accuracy", type=float, help="exit 1 if accuracy falls below this fraction")
+    args = parser.parse_args(argv)
+    if args.detector == "dnn" and not args.model:
+        parser.error("--detector dnn needs --model")
+
+    if args.synthetic:
+        source = SyntheticSource(fps=args.fps or 15.0)
+        labels = load_labels(args.labels) if args.labels else source.occupied
+    elif args.video:
+        source = VideoFileSource(args.video, args.fps)
+        labels = load_labels(args.labels) if args.labels else None
+    else:
+        parser.error("give a video file or --synthetic")
+
+    detector_options = {"model_path": args.model, "output_format": args.model_format} if args.detector == "dnn" else {}
+    report = replay(source, labels, args.mode, args.warning_after, args.off_after,
+                    measure_memory=not args.no_memory, detector=args.detector, detector_options=detector_options)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.min_accuracy is not None:
+        accuracy = report.get("accuracy", {}).get("accuracy")
+        if accuracy is None or accuracy < args.min_accuracy:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,568 @@
+import collections
+import datetime
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pipeline import FpsCounter
+from scheduler import FrameScheduler, Throttle
+from occupancy import OccupancyStateMachine, ENTERED, LEFT, ON, OFF, WARNING as OCCUPANCY_WARNING
+from metrics import STAGE_SECONDS, FRAMES, FRAMES_DROPPED, OCCUPIED as OCCUPIED_GAUGE, \
+    APPLIANCE_ON, TRANSITIONS, room_label
+
+DEFAULT_APPLIANCES = ("LIGHTS", "AIRCON")
+
+OCCUPIED = "occupied"
+WARNING = "warning"
+WAITING = "waiting"
+VACATED = "vacated"
+IDLE = "idle"
+
+
+class Room:
+    def __init__(self, name=None, appliances=DEFAULT_APPLIANCES, warning_after=10, off_after=15,
+                 clock=time.monotonic, log=None, on_change=None, timeouts=None, window=5, votes_on=3,
+                 votes_off=1, debounce=0.0):
+        self.name = name
+        self.warning_after = warning_after
+        self.off_after = off_after
+        self.clock = clock
+        self.log = log
+        self.on_change = on_change
+        # timeouts: per-appliance off delays overriding off_after, e.g. {"AIRCON": 120}
+        self.occupancy = OccupancyStateMachine(appliances, warning_after, off_after, timeouts, window, votes_on,
+                                               votes_off, debounce, clock)
+
+        self.appliance_states = {appliance: False for appliance in appliances}
+        self.appliance_start_times = {}
+        self.daily_durations = {appliance: datetime.timedelta() for appliance in appliances}
+        self.lock = threading.RLock()
+        self.metrics_label = room_label(name)
+        self._occupied_gauge = OCCUPIED_GAUGE.labels(self.metrics_label)
+
+    def label(self, appliance):
+        return appliance if self.name is None else f"{self.name}:{appliance}"
+
+    def update(self, detected, source=None):
+        # source: the camera the frame came from; each camera votes separately
+        with self.lock:
+            events = self.occupancy.update(detected, source=source)
+            status = None
+            for event in events:
+                if event.kind in (ENTERED, LEFT):
+                    self._occupied_gauge.set(1 if event.kind == ENTERED else 0)
+                elif event.kind == ON:
+                    self._switch_on(event.appliance)
+                elif event.kind == OFF:
+                    self._switch_off(event.appliance)
+                    if self.occupancy.all_off():
+                        status = VACATED
+                elif event.kind == OCCUPANCY_WARNING:
+                    status = WARNING
+            if self.occupancy.present:
+                return OCCUPIED
+            if status is not None:
+                return status
+            return IDLE if self.occupancy.all_off() else WAITING
+
+    def turn_on_appliances(self):
+        with self.lock:
+            for appliance in self.appliance_states:
+                self.occupancy.set_appliance(appliance, True)
+                self._switch_on(appliance)
+
+    def turn_off_appliances(self):
+        with self.lock:
+            for appliance in self.appliance_states:
+                self.occupancy.set_appliance(appliance, False)
+                self._switch_off(appliance)
+            self.occupancy.reset()
+            self._occupied_gauge.set(0)
+
+    def _switch_on(self, appliance):
+        if not self.appliance_states[appliance]:
+            self.appliance_states[appliance] = True
+            self.appliance_start_times[appliance] = self.clock()
+            self._emit(appliance, True, None)
+
+    def _switch_off(self, appliance):
+        if self.appliance_states[appliance]:
+            duration = None
+            start_time = self.appliance_start_times.pop(appliance, None)
+            if start_time is not None:
+                duration = datetime.timedelta(seconds=self.clock() - start_time)
+                self.daily_durations[appliance] += duration
+            self.appliance_states[appliance] = False
+            self._emit(appliance, False, duration)
+
+    def _emit(self, appliance, on, duration):
+        TRANSITIONS.labels(self.metrics_label, appliance, "on" if on else "off").inc()
+        APPLIANCE_ON.labels(self.metrics_label, appliance).set(1 if on else 0)
+        if self.on_change:
+            self.on_change(self, appliance, on)
+        if self.log:
+            if on:
+                self.log(f"{self.label(appliance)} turned ON")
+            else:
+                self.log(f"{self.label(appliance)} turned OFF after {duration}")
+
+
+Camera = collections.namedtuple("Camera", ["camera_id", "source", "room", "detection_mode", "detector"])
+
+
+class RoomRegistry:
+    def __init__(self):
+        self.rooms = {}
+        self.cameras = {}
+
+    def add_room(self, name, appliances=DEFAULT_APPLIANCES, **options):
+        if name in self.rooms:
+            raise ValueError(f"Room {name!r} already registered")
+        room = Room(name, appliances, **options)
+        self.rooms[name] = room
+        return room
+
+    def add_camera(self, camera_id, source, room, detection_mode="balanced", detector="cascade"):
+        if room not in self.rooms:
+            raise KeyError(f"Unknown room {room!r}")
+        if camera_id in self.cameras:
+            raise ValueError(f"Camera {camera_id!r} already registered")
+        camera = Camera(camera_id, source, room, detection_mode, detector)
+        self.cameras[camera_id] = camera
+        return camera
+
+    def remove_camera(self, camera_id):
+        return self.cameras.pop(camera_id)
+
+    def cameras_for(self, room):
+        return [camera for camera in self.cameras.values() if camera.room == room]
+
+
+# Detector state lives in the worker processes. A camera is always routed
+# to the same worker so its MOG2 background model (and any tracking state in
+# its detector backend) stays coherent from frame to frame.
+_worker_motion = {}
+_worker_backends = {}
+_worker_background_dir = None
+
+
+def _init_worker(background_dir):
+    global _worker_background_dir
+    _worker_background_dir = background_dir
+    # Pay for the OpenCV import and the shared cascade before the first frame arrives
+    import detectors
+    detectors.default_cascade()
+
+
+def _background_path(camera_id):
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(camera_id))
+    return os.path.join(_worker_background_dir, f"{safe}.bg.png")
+
+
+def _save_backgrounds_in_worker():
+    if not _worker_background_dir:
+        return 0
+    os.makedirs(_worker_background_dir, exist_ok=True)
+    return sum(detector.save_background(_background_path(camera_id))
+               for camera_id, detector in _worker_motion.items())
+
+
+def _worker_backend(detector, options, camera_id, detection_mode):
+    from detectors import BACKENDS, create_detector
+
+    key = (detector, camera_id if BACKENDS[detector].per_camera else None, detection_mode)
+    backend = _worker_backends.get(key)
+    if backend is None:
+        backend = _worker_backends[key] = create_detector(detector, mode=detection_mode, **options)
+    return backend
+
+
+def _load_backends_in_worker(specs):
+    # Runs once per worker at engine start, so a missing model or a broken
+    # OpenCV install fails start() instead of every frame afterwards
+    for detector, options, camera_id, detection_mode in specs:
+        _worker_backend(detector, options, camera_id, detection_mode).warm_up()
+    return len(specs)
+
+
+def _detect_batch_in_worker(detector, options, items):
+    import cv2
+    from detectors import BACKENDS
+    from motion import MotionDetector
+
+    backend_cls = BACKENDS[detector]
+    backends, images, motions, motion_seconds = [], [], [], []
+    for camera_id, image, detection_mode in items:
+        backend = _worker_backend(detector, options, camera_id, detection_mode)
+        motion_detector = _worker_motion.get(camera_id)
+        if motion_detector is None:
+            motion_detector = _worker_motion[camera_id] = MotionDetector()
+            if _worker_background_dir:
+                motion_detector.load_background(_background_path(camera_id))
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        start = time.perf_counter()
+        motions.append(motion_detector.apply(gray))
+        motion_seconds.append(time.perf_counter() - start)
+        backends.append(backend)
+        images.append(image if backend_cls.needs_color else gray)
+
+    # Worker processes have their own metric registries, so stage timings
+    # travel back with the results and are recorded in the parent
+    start = time.perf_counter()
+    if backend_cls.batchable:
+        boxes = backends[0].detect_batch(images, motions)
+    else:
+        boxes = [backend.detect(image, motion) for backend, image, motion in zip(backends, images, motions)]
+    detect_share = (time.perf_counter() - start) / len(items)
+    return [(faces, motion, seconds, detect_share) for faces, motion, seconds in zip(boxes, motions, motion_seconds)]
+
+
+class _BatchDispatcher:
+    """Groups frames bound for one worker process into batched calls.
+
+    Batchable backends (the DNN) wait up to max_wait for frames from the
+    worker's other cameras so they share one inference (never when it has
+    only one); the rest send whatever is queued.
+    """
+
+    def __init__(self, engine, executor, batch_size=8, max_wait=0.005):
+        self.engine = engine
+        self.executor = executor
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        # Cameras pinned to this worker per detector; no point waiting for more frames than cameras
+        self.cameras = collections.Counter()
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="dispatch", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def join(self, timeout):
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def enqueue(self, runner, image):
+        with self._cond:
+            self._queue.append((runner, image))
+            self._cond.notify()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue and not self.engine.stopped.is_set():
+                self._cond.wait(0.1)
+            if not self._queue:
+                return None, []
+            detector = self._queue[0][0].camera.detector
+            wanted = min(self.batch_size, self.cameras[detector])
+            if self.engine.batchable(detector) and len(self._queue) < wanted:
+                deadline = time.monotonic() + self.max_wait
+                while len(self._queue) < wanted and not self.engine.stopped.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            batch, rest = [], collections.deque()
+            while self._queue and len(batch) < self.batch_size:
+                item = self._queue.popleft()
+                (batch if item[0].camera.detector == detector else rest).append(item)
+            rest.extend(self._queue)
+            self._queue = rest
+            return detector, batch
+
+    def _run(self):
+        while not self.engine.stopped.is_set():
+            detector, batch = self._take_batch()
+            if not batch:
+                continue
+            items = [(runner.camera.camera_id, image, runner.camera.detection_mode) for runner, image in batch]
+            runners = [runner for runner, _ in batch]
+            try:
+                future = self.executor.submit(_detect_batch_in_worker, detector,
+                                              self.engine.detector_options.get(detector, {}), items)
+            except BrokenProcessPool as exc:
+                self.engine.fail(exc)
+                for runner in runners:
+                    runner.release()
+                continue
+            except RuntimeError:
+                for runner in runners:
+                    runner.release()
+                continue
+            future.add_done_callback(lambda f, runners=runners: self._done(f, runners))
+
+    def _done(self, future, runners):
+        try:
+            results = future.result()
+        except Exception as exc:
+            if isinstance(exc, BrokenProcessPool):
+                self.engine.fail(exc)
+            for runner in runners:
+                runner.failed(exc)
+            return
+        for runner, result in zip(runners, results):
+            runner.finished(result)
+
+
+class _CameraRunner:
+    def __init__(self, engine, camera, room, dispatcher):
+        self.engine = engine
+        self.camera = camera
+        self.room = room
+        self.dispatcher = dispatcher
+        self.capture_fps = FpsCounter()
+        self.detect_fps = FpsCounter()
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_status = IDLE
+        self.last_faces = ()
+        label = room.metrics_label
+        self._capture_seconds = STAGE_SECONDS.labels("capture", label)
+        self._motion_seconds = STAGE_SECONDS.labels("motion", label)
+        self._faces_seconds = STAGE_SECONDS.labels("faces", label)
+        self._frames = FRAMES.labels(label)
+        self._dropped = FRAMES_DROPPED.labels(label)
+        self.scheduler = FrameScheduler(room, **engine.schedule) if engine.schedule is not None else None
+
+        self._lock = threading.Lock()
+        self._busy = False
+        self._pending = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._capture_loop, name=f"capture-{self.camera.camera_id}",
+                                        daemon=True)
+        self._thread.start()
+
+    def join(self, timeout):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _open(self):
+        source = self.camera.source
+        if hasattr(source, "read"):
+            return source
+        import cv2
+        return cv2.VideoCapture(source)
+
+    def _capture_loop(self):
+        import cv2
+        from detectors import BACKENDS
+        needs_color = BACKENDS[self.camera.detector].needs_color
+        capture = self._open()
+        throttle = Throttle(self.scheduler, self.engine.stopped)
+        try:
+            while not self.engine.stopped.is_set():
+                if not throttle.due(capture):
+                    continue
+                with self._capture_seconds.time():
+                    ret, frame = capture.read()
+                if not ret:
+                    time.sleep(0.05)
+                    continue
+                self.capture_fps.tick()
+                if not needs_color and frame.ndim == 3:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                self._offer(frame)
+        finally:
+            if hasattr(capture, "release"):
+                capture.release()
+
+    def _offer(self, image):
+        # At most one frame per camera is in flight; newer frames replace the pending one
+        with self._lock:
+            if self._busy:
+                if self._pending is not None:
+                    self.dropped += 1
+                    self._dropped.inc()
+                self._pending = image
+                return
+            self._busy = True
+        self._submit(image)
+
+    def _submit(self, image):
+        if self.engine.stopped.is_set():
+            self.release()
+            return
+        self.dispatcher.enqueue(self, image)
+
+    def release(self):
+        with self._lock:
+            self._busy = False
+            self._pending = None
+
+    def failed(self, exc):
+        self.errors += 1
+        if self.errors == 1:
+            print(f"Detection failed for camera {self.camera.camera_id!r} ({self.camera.room}): {exc!r}",
+                  file=sys.stderr, flush=True)
+        self._next()
+
+    def finished(self, result):
+        faces, motion, motion_seconds, faces_seconds = result
+        self.processed += 1
+        self._frames.inc()
+        self._motion_seconds.observe(motion_seconds)
+        self._faces_seconds.observe(faces_seconds)
+        self.detect_fps.tick()
+        self.last_faces = faces
+        self.last_status = self.room.update(len(faces) > 0 or motion, source=self.camera.camera_id)
+        self._next()
+
+    def _next(self):
+        with self._lock:
+            image = self._pending
+            self._pending = None
+            if image is None:
+                self._busy = False
+                return
+        self._submit(image)
+
+
+class PresenceEngine:
+    """Runs detection for every registered camera on per-core worker processes."""
+
+    def __init__(self, registry, workers=None, detector_options=None, batch_size=8, max_batch_wait=0.005,
+                 background_dir=None, schedule=None):
+        self.registry = registry
+        self.workers = workers or os.cpu_count() or 1
+        # Per-backend constructor options, e.g. {"dnn": {"model_path": "person.onnx"}}
+        self.detector_options = detector_options or {}
+        self.batch_size = batch_size
+        self.max_batch_wait = max_batch_wait
+        # Where each camera's MOG2 background is saved on stop and restored on start
+        self.background_dir = background_dir
+        # FrameScheduler options shared by every camera ({} for the defaults); None samples every frame
+        self.schedule = schedule
+        self.stopped = threading.Event()
+        # The exception that stopped the engine on its own (a worker process died)
+        self.failure = None
+        self._executors = []
+        self._dispatchers = []
+        self._runners = {}
+
+    @staticmethod
+    def batchable(detector):
+        from detectors import BACKENDS
+        return BACKENDS[detector].batchable
+
+    def assign_workers(self):
+        """[(camera, worker index)] for every registered camera.
+
+        Cameras of batchable backends (the DNN) are packed batch_size to a
+        worker so their frames share one inference; the rest are spread
+        round-robin, and each packed group takes the next worker in turn.
+        """
+        from detectors import BACKENDS
+        assignments, batched = [], collections.defaultdict(list)
+        slot = 0
+        for camera in self.registry.cameras.values():
+            backend_cls = BACKENDS[camera.detector]
+            if backend_cls.batchable and not backend_cls.per_camera:
+                batched[camera.detector].append(camera)
+            else:
+                assignments.append((camera, slot % self.workers))
+                slot += 1
+        for cameras in batched.values():
+            for first in range(0, len(cameras), self.batch_size):
+                worker = slot % self.workers
+                assignments.extend((camera, worker) for camera in cameras[first:first + self.batch_size])
+                slot += 1
+        return assignments
+
+    def start(self):
+        """Starts the workers and camera threads.
+
+        Every camera's detector backend is loaded in its worker before the
+        first frame; RuntimeError is raised, with the engine stopped again,
+        if a worker cannot start or a backend fails to load (for example a
+        missing or invalid ONNX model).
+        """
+        self.stopped.clear()
+        self.failure = None
+        # One single-process executor per core: each camera is pinned to one
+        # (see assign_workers) so its detector state stays in one process.
+        self._executors = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                               initargs=(self.background_dir,))
+                           for _ in range(self.workers)]
+        assignments = self.assign_workers()
+        specs = [[] for _ in self._executors]
+        for camera, worker in assignments:
+            specs[worker].append((camera.detector, self.detector_options.get(camera.detector, {}),
+                                  camera.camera_id, camera.detection_mode))
+        loads = [executor.submit(_load_backends_in_worker, worker_specs)
+                 for executor, worker_specs in zip(self._executors, specs) if worker_specs]
+        for future in loads:
+            try:
+                future.result()
+            except Exception as exc:
+                self.stop()
+                raise RuntimeError(f"Detector backend failed to load: {exc!r}") from exc
+        self._dispatchers = [_BatchDispatcher(self, executor, self.batch_size, self.max_batch_wait)
+                             for executor in self._executors]
+        for camera, worker in assignments:
+            self._dispatchers[worker].cameras[camera.detector] += 1
+        for dispatcher in self._dispatchers:
+            dispatcher.start()
+        for camera, worker in assignments:
+            dispatcher = self._dispatchers[worker]
+            runner = _CameraRunner(self, camera, self.registry.rooms[camera.room], dispatcher)
+            self._runners[camera.camera_id] = runner
+            runner.start()
+
+    def fail(self, exc):
+        # A dead worker process cannot be resubmitted to; stop instead of spinning
+        if self.failure is None:
+            self.failure = exc
+            print(f"Detection worker died, stopping the engine: {exc!r}", file=sys.stderr, flush=True)
+        self.stopped.set()
+
+    def stop(self, timeout=2.0):
+        self.stopped.set()
+        for runner in self._runners.values():
+            runner.join(timeout)
+        for dispatcher in self._dispatchers:
+            dispatcher.join(timeout)
+        if self.background_dir:
+            for executor in self._executors:
+                try:
+                    executor.submit(_save_backgrounds_in_worker).result(timeout)
+                except Exception:
+                    pass
+        for executor in self._executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._executors = []
+        self._dispatchers = []
+        self._runners = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        cameras = {}
+        for camera_id, runner in self._runners.items():
+            cameras[camera_id] = {
+                "room": runner.camera.room,
+                "capture_fps": runner.capture_fps.fps,
+                "detect_fps": runner.detect_fps.fps,
+                "processed": runner.processed,
+                "dropped": runner.dropped,
+                "errors": runner.errors,
+                "status": runner.last_status,
+                "target_fps": runner.scheduler.fps if runner.scheduler else None,
+            }
+        return {
+            "workers": self.workers,
+            "aggregate_fps": sum(c["detect_fps"] for c in cameras.values()),
+            "cameras": cameras,
+        }
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from metrics import TARGET_FPS, room_label
+
+
+class LoadMonitor:
+    """Host CPU load as a 0..1+ fraction, sampled at most every `period` seconds.
+
+    Uses psutil when installed, otherwise the 1-minute load average divided
+    by the core count. Shared by every scheduler in the process.
+    """
+
+    def __init__(self, period=1.0):
+        self.period = period
+        self._value = 0.0
+        self._sampled = None
+        self._lock = threading.Lock()
+        self._cores = os.cpu_count() or 1
+        if psutil is not None:
+            psutil.cpu_percent(None)  # the first call only starts the measurement
+
+    def _sample(self):
+        if psutil is not None:
+            return psutil.cpu_percent(None) / 100.0
+        if hasattr(os, "getloadavg"):
+            return os.getloadavg()[0] / self._cores
+        return 0.0
+
+    @property
+    def load(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._sampled is None or now - self._sampled >= self.period:
+                try:
+                    self._value = self._sample()
+                except OSError:
+                    self._value = 0.0
+                self._sampled = now
+            return self._value
+
+
+_default_monitor = None
+
+
+def default_monitor():
+    global _default_monitor
+    if _default_monitor is None:
+        _default_monitor = LoadMonitor()
+    return _default_monitor
+
+
+class FrameScheduler:
+    """Chooses how often a room's camera is sampled.
+
+    Frames run at active_fps around transitions: for settle_after seconds
+    after the room is entered or left, during the warning / off countdown
+    while appliances are still on, and as soon as the vote window is no
+    longer unanimous (the first positive frame in an empty room, the first
+    negative one in an occupied room). Once a room has been steadily
+    occupied or steadily empty it drops to occupied_fps / empty_fps. When
+    host load exceeds load_budget the interval grows proportionally, down
+    to min_fps.
+    """
+
+    def __init__(self, room=None, active_fps=15.0, occupied_fps=1.0, empty_fps=2.0, settle_after=30.0,
+                 load_budget=0.75, min_fps=0.5, monitor=None, clock=None):
+        self.room = room
+        self.active_fps = active_fps
+        self.occupied_fps = occupied_fps
+        self.empty_fps = empty_fps
+        self.settle_after = settle_after
+        self.load_budget = load_budget
+        self.min_fps = min_fps
+        self.monitor = monitor or default_monitor()
+        # Must be the clock the room's occupancy machine stamps transitions with
+        self.clock = clock or (room.clock if room is not None else time.monotonic)
+        self.fps = active_fps
+        self._started = self.clock()
+        self._fps_gauge = TARGET_FPS.labels(room_label(room.name if room is not None else None))
+        self._fps_gauge.set(active_fps)
+
+    def target_fps(self):
+        occupancy = self.room.occupancy if self.room is not None else None
+        if occupancy is None:
+            return self.active_fps
+        changed_at = self._started if occupancy.changed_at is None else occupancy.changed_at
+        if self.clock() - changed_at < self.settle_after:
+            return self.active_fps
+        if occupancy.present:
+            return self.occupied_fps if occupancy.positives == occupancy.window else self.active_fps
+        if not occupancy.all_off():
+            return self.active_fps
+        return self.empty_fps if occupancy.positives == 0 else self.active_fps
+
+    def interval(self):
+        fps = self.target_fps()
+        load = self.monitor.load if self.load_budget else 0.0
+        if load > self.load_budget:
+            fps = max(self.min_fps, fps * self.load_budget / load)
+        if fps != self.fps:
+            self.fps = fps
+            self._fps_gauge.set(fps)
+        return 1.0 / fps
+
+
+class Throttle:
+    """Paces a capture loop to a scheduler's interval.
+
+    Frames between samples are grabbed but not decoded, so the driver's
+    buffer stays fresh and a sampled frame is never seconds old. The next
+    sample is due interval() after the last one, re-evaluated on every call:
+    the interval is booked before the sampled frame reaches detection, so a
+    detection that raises the rate has to cut the current wait short.
+    """
+
+    def __init__(self, scheduler, stop_event, poll=0.05):
+        self.scheduler = scheduler
+        self.stop_event = stop_event
+        self.poll = poll
+        self.skipped = 0
+        self._last = None
+
+    def due(self, source):
+        if self.scheduler is None:
+            return True
+        now = time.monotonic()
+        if self._last is None or now >= self._last + self.scheduler.interval():
+            self._last = now
+            return True
+        self.skipped += 1
+        if hasattr(source, "grab"):
+            source.grab()
+            # Live cameras block in grab() until the next frame; files and
+            # streams that return at once are paced by waiting instead
+            if time.monotonic() - now >= 0.005:
+                return False
+        remaining = self._last + self.scheduler.interval() - time.monotonic()
+        self.stop_event.wait(min(remaining, self.poll))
+        return False
@@ -0,0 +1,68 @@
+import pytest
+
+from actuation import ActuationError, Actuator, DeviceSimulator
+
+
+@pytest.fixture
+def simulator():
+    simulator = DeviceSimulator(seed=1).start()
+    yield simulator
+    simulator.stop()
+
+
+def test_on_off_on_coalesces_into_one_command(simulator):
+    simulator.latency = 0.2
+    actuator = Actuator(simulator.address).start()
+    try:
+        actuator.set("lobby:AIRCON", True)   # in flight
+        actuator.set("lobby:AIRCON", False)  # superseded while queued
+        actuator.set("lobby:AIRCON", True)   # matches the confirmed state: dropped
+        actuator.flush(5)
+    finally:
+        actuator.stop()
+    assert simulator.commands == 1
+    assert simulator.states == {"lobby:AIRCON": True}
+    assert actuator.stats()["sent"] == 1
+    assert actuator.stats()["coalesced"] == 2
+
+
+def test_failed_commands_are_retried(simulator):
+    simulator.failure_rate = 0.5
+    results = []
+    actuator = Actuator(simulator.address, retries=10, backoff=0.001,
+                        on_result=lambda device, on, error: results.append(error)).start()
+    try:
+        for index in range(10):
+            actuator.set(f"room{index}:LIGHTS", True)
+        actuator.flush(10)
+    finally:
+        actuator.stop()
+    stats = actuator.stats()
+    assert stats["sent"] == 10 and stats["failed"] == 0
+    assert stats["retried"] > 0
+    assert results == [None] * 10
+    assert all(simulator.states.values()) and len(simulator.states) == 10
+
+
+def test_unreachable_device_counts_one_failure():
+    errors = []
+    actuator = Actuator("127.0.0.1:1", retries=2, backoff=0.001, timeout=1.0,
+                        on_result=lambda device, on, error: errors.append(error)).start()
+    try:
+        actuator.set("lobby:LIGHTS", True)
+        actuator.flush(10)
+    finally:
+        actuator.stop()
+    stats = actuator.stats()
+    assert (stats["sent"], stats["failed"], stats["retried"]) == (0, 1, 2)
+    assert len(errors) == 1 and isinstance(errors[0], ActuationError)
+    assert actuator.states() == {"lobby:LIGHTS": None}
+
+
+def test_set_rejects_unroutable_devices():
+    actuator = Actuator(devices={"lobby:LIGHTS": "127.0.0.1:1"}).start()
+    try:
+        with pytest.raises(ActuationError):
+            actuator.set("office:LIGHTS", True)
+    finally:
+        actuator.stop()
@@ -0,0 +1,40 @@
+import socket
+import sqlite3
+
+import pytest
+
+from presence_daemon import PresenceController
+
+
+def test_busy_metrics_port_does_not_leak_the_engine(tmp_path, capsys):
+    busy = socket.socket()
+    busy.bind(("127.0.0.1", 0))
+    busy.listen(1)
+    port = busy.getsockname()[1]
+    try:
+        controller = PresenceController(str(tmp_path / "log.csv"), workers=1, keep_days=0)
+        room = controller.registry.add_room("lobby", log=controller.log_activity)
+        room.turn_on_appliances()
+        assert all(room.appliance_states.values())
+        controller.stop()
+        controller.run(metrics_port=port)
+    finally:
+        busy.close()
+    assert f"cannot bind port {port}" in capsys.readouterr().err
+    assert controller.engine._executors == []
+    assert not any(room.appliance_states.values())
+    logged = (tmp_path / "log.csv").read_text()
+    assert "lobby:LIGHTS turned OFF" in logged and "lobby:AIRCON turned OFF" in logged
+
+
+def test_batch_size_reaches_the_engine(tmp_path):
+    controller = PresenceController(str(tmp_path / "log.csv"), workers=1, keep_days=0, batch_size=3)
+    assert controller.engine.batch_size == 3
+    controller.shutdown()
+
+
+def test_shutdown_closes_the_log_store(tmp_path):
+    controller = PresenceController(str(tmp_path / "log.csv"), workers=1, keep_days=0)
+    controller.shutdown()
+    with pytest.raises(sqlite3.ProgrammingError):
+        controller.log_store.count()
@@ -0,0 +1,25 @@
+import pytest
+
+import detectors
+from detectors import DnnBackend
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    # Skip loading an ONNX file; only the preprocessing settings are checked
+    monkeypatch.setitem(detectors._models, ("onnx", "person.onnx"), object())
+    return "person.onnx"
+
+
+def test_dnn_preprocessing_follows_the_output_format(fake_model):
+    ssd = DnnBackend(fake_model)
+    assert ssd.input_size == (300, 300) and ssd.scale == 1 / 127.5 and ssd.mean == (127.5, 127.5, 127.5)
+    yolo = DnnBackend(fake_model, output_format="yolov8")
+    assert yolo.input_size == (640, 640) and yolo.scale == 1 / 255.0 and yolo.mean == (0.0, 0.0, 0.0)
+    custom = DnnBackend(fake_model, output_format="yolov8", input_size=(320, 320), scale=1.0)
+    assert custom.input_size == (320, 320) and custom.scale == 1.0 and custom.mean == (0.0, 0.0, 0.0)
+
+
+def test_dnn_backend_needs_a_model():
+    with pytest.raises(ValueError):
+        DnnBackend()
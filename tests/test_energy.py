@@ -0,0 +1,89 @@
+import numpy as np
+
+from energy import EnergyLedger, TariffSchedule, _coverage, _to_seconds, synthetic_history
+
+
+def at(stamp):
+    return int(_to_seconds(stamp))
+
+
+# lobby lights 22:00-01:00 across midnight, aircon for half an hour the next morning
+APPLIANCES = ["LIGHTS", "AIRCON"]
+STARTS = [at("2025-03-01T22:00:00"), at("2025-03-02T09:00:00")]
+ENDS = [at("2025-03-02T01:00:00"), at("2025-03-02T09:30:00")]
+
+
+def test_coverage_counts_on_seconds_before_each_edge():
+    starts, ends = np.array([10, 30]), np.array([20, 50])
+    edges = np.array([0, 15, 25, 40, 60])
+    assert _coverage(starts, ends, edges).tolist() == [0, 5, 10, 20, 30]
+
+
+def test_daily_splits_a_session_at_midnight():
+    ledger = EnergyLedger(APPLIANCES, STARTS, ENDS)
+    daily = ledger.daily()
+    assert daily.periods == ["2025-03-01", "2025-03-02"]
+    lights = daily.appliances.index("LIGHTS")
+    aircon = daily.appliances.index("AIRCON")
+    assert np.allclose(daily.kwh[lights], [0.12, 0.06])
+    assert np.allclose(daily.kwh[aircon], [0.0, 0.5])
+
+
+def test_intervals_are_clipped_to_the_requested_span():
+    ledger = EnergyLedger(APPLIANCES, STARTS, ENDS, start="2025-03-02", end="2025-03-02")
+    daily = ledger.daily()
+    assert daily.periods == ["2025-03-02"]
+    assert np.allclose(daily.kwh[daily.appliances.index("LIGHTS")], [0.06])
+
+    # Nothing of the aircon session falls on the 1st
+    ledger = EnergyLedger(APPLIANCES, STARTS, ENDS, start="2025-03-01", end="2025-03-01")
+    assert ledger.appliances == ["LIGHTS"]
+    assert np.allclose(ledger.daily().kwh, [[0.12]])
+
+
+def test_daily_and_monthly_sum_to_hourly():
+    appliances, starts, ends = synthetic_history(rooms=2, days=70, sessions_per_day=6)
+    ledger = EnergyLedger(appliances, starts, ends)
+    hourly, daily, monthly = ledger.hourly(), ledger.daily(), ledger.monthly()
+    assert len(hourly.periods) == 24 * len(daily.periods)
+    assert monthly.periods[:3] == ["2025-01", "2025-02", "2025-03"]
+    for rollup in (daily, monthly):
+        assert np.allclose(rollup.kwh.sum(axis=1), hourly.kwh.sum(axis=1))
+        assert np.allclose(rollup.cost.sum(axis=1), hourly.cost.sum(axis=1))
+    on_seconds = {a: 0 for a in ledger.appliances}
+    for appliance, start, end in zip(appliances, starts, ends):
+        on_seconds[appliance] += end - start
+    watts = np.array([ledger.watts_for(a) for a in ledger.appliances])
+    expected = np.array([on_seconds[a] for a in ledger.appliances]) / 3600 * watts / 1000
+    assert np.allclose(hourly.kwh.sum(axis=1), expected)
+
+
+def test_time_of_use_cost():
+    tariff = TariffSchedule(0.20, [(22, 6, 0.10)])
+    daily = EnergyLedger(APPLIANCES, STARTS, ENDS, tariff=tariff).daily()
+    lights = daily.appliances.index("LIGHTS")
+    aircon = daily.appliances.index("AIRCON")
+    assert np.allclose(daily.cost[lights], [0.012, 0.006])
+    assert np.allclose(daily.cost[aircon], [0.0, 0.1])
+
+
+def test_wrapping_period_continues_into_the_next_weekday():
+    # Weeknights from 22:00: Friday night runs into Saturday morning, not Monday's
+    tariff = TariffSchedule(0.20, [(22, 6, 0.10, range(5))])
+    friday_night = at("2025-03-07T23:00:00")
+    saturday_early = at("2025-03-08T03:00:00")
+    monday_early = at("2025-03-10T03:00:00")
+    saturday_night = at("2025-03-08T23:00:00")
+    rates = tariff.hourly_rates(np.array([friday_night, saturday_early, monday_early, saturday_night]))
+    assert rates.tolist() == [0.10, 0.10, 0.20, 0.20]
+
+
+def test_savings_against_an_office_hours_baseline():
+    ledger = EnergyLedger(["AIRCON"], STARTS[1:], ENDS[1:])
+    savings = ledger.savings(baseline_hours=(8, 18))
+    aircon = savings["appliances"]["AIRCON"]
+    assert savings["days"] == 1
+    assert np.isclose(aircon["kwh"], 0.5) and np.isclose(aircon["cost"], 0.1)
+    assert np.isclose(aircon["baseline_kwh"], 10.0)
+    assert np.isclose(aircon["saved_kwh"], 9.5) and np.isclose(aircon["saved_cost"], 1.9)
+    assert np.isclose(ledger.savings()["total"]["saved_kwh"], 24.0 - 0.5)
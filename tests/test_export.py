@@ -0,0 +1,98 @@
+import csv
+import datetime
+import gzip
+import os
+
+import pytest
+
+import export
+from export import check_date_range, rotate_csv, archive_path
+
+TODAY = datetime.date(2025, 3, 31)
+ROWS = [
+    ["09:00:00", "LIGHTS turned ON"],
+    ["2025-01-15", "09:00:00", "LIGHTS turned ON"],
+    ["2025-02-10", "09:00:00", "LIGHTS turned OFF after 0:05:00"],
+    ["2025-03-20", "09:00:00", "AIRCON turned ON"],
+]
+
+
+def write_log(path):
+    with open(path, "w", newline='') as file:
+        csv.writer(file).writerows(ROWS)
+
+
+def read_csv(path):
+    with open(path, newline='') as file:
+        return list(csv.reader(file))
+
+
+def read_archive(path):
+    with gzip.open(path, "rt", newline='') as file:
+        return list(csv.reader(file))
+
+
+def test_rotate_moves_old_rows_into_monthly_archives(tmp_path):
+    log = str(tmp_path / "appliance_logs.csv")
+    write_log(log)
+    assert rotate_csv(log, keep_days=30, today=TODAY) == 3
+    assert read_csv(log) == [ROWS[3]]
+    assert read_archive(archive_path(log, "undated")) == [ROWS[0]]
+    assert read_archive(archive_path(log, "2025-01")) == [ROWS[1]]
+    assert read_archive(archive_path(log, "2025-02")) == [ROWS[2]]
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ["appliance_logs.csv", "appliance_logs-undated.csv.gz",
+         "appliance_logs-2025-01.csv.gz", "appliance_logs-2025-02.csv.gz"])
+    assert rotate_csv(log, keep_days=30, today=TODAY) == 0
+
+
+def test_crash_before_the_csv_is_replaced_does_not_duplicate_rows(tmp_path, monkeypatch):
+    log = str(tmp_path / "appliance_logs.csv")
+    with gzip.open(archive_path(log, "2025-01"), "wt", newline='') as file:
+        csv.writer(file).writerow(["2025-01-01", "08:00:00", "AIRCON turned ON"])
+    write_log(log)
+
+    real_replace = os.replace
+
+    def crash(src, dst):
+        if dst == log:
+            raise OSError("simulated crash")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(export.os, "replace", crash)
+    with pytest.raises(OSError):
+        rotate_csv(log, keep_days=30, today=TODAY)
+    # The archives already hold the rows but the CSV still does too
+    assert read_csv(log) == ROWS
+    assert len(read_archive(archive_path(log, "2025-01"))) == 2
+
+    monkeypatch.setattr(export.os, "replace", real_replace)
+    assert rotate_csv(log, keep_days=30, today=TODAY) == 3
+    assert read_csv(log) == [ROWS[3]]
+    assert read_archive(archive_path(log, "2025-01")) == [
+        ["2025-01-01", "08:00:00", "AIRCON turned ON"], ROWS[1]]
+    assert read_archive(archive_path(log, "undated")) == [ROWS[0]]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith((".pending", ".json", ".rotate"))]
+
+
+def test_failure_before_commit_leaves_everything_untouched(tmp_path, monkeypatch):
+    log = str(tmp_path / "appliance_logs.csv")
+    write_log(log)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(export.json, "dump", fail)
+    with pytest.raises(OSError):
+        rotate_csv(log, keep_days=30, today=TODAY)
+    assert read_csv(log) == ROWS
+    assert os.listdir(tmp_path) == ["appliance_logs.csv"]
+
+
+def test_check_date_range():
+    assert check_date_range(" 2025-03-01 ", "") == ("2025-03-01", None)
+    assert check_date_range(None, None) == (None, None)
+    with pytest.raises(ValueError, match="start date"):
+        check_date_range("2025-13-01", None)
+    with pytest.raises(ValueError, match="after end date"):
+        check_date_range("2025-03-02", "2025-03-01")
@@ -0,0 +1,66 @@
+import os
+import time
+
+import pytest
+
+from logsink import LogSink, CsvLogWriter, FSYNC_NEVER, FSYNC_INTERVAL, FSYNC_BATCH
+
+
+@pytest.mark.parametrize("fsync", [FSYNC_NEVER, FSYNC_INTERVAL, FSYNC_BATCH])
+def test_single_row_reaches_disk_within_max_delay(tmp_path, fsync):
+    path = str(tmp_path / "log.csv")
+    sink = LogSink([CsvLogWriter(path)], max_delay=0.2, fsync=fsync)
+    try:
+        sink.log("LIGHTS turned ON")
+        deadline = time.monotonic() + 0.2 + 0.5
+        while time.monotonic() < deadline:
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                break
+            time.sleep(0.01)
+        with open(path) as file:
+            assert file.read().strip().endswith("LIGHTS turned ON")
+    finally:
+        sink.close()
+
+
+def test_full_batch_is_written_without_waiting(tmp_path):
+    path = str(tmp_path / "log.csv")
+    sink = LogSink([CsvLogWriter(path)], max_batch=3, max_delay=60)
+    try:
+        for i in range(3):
+            sink.log(f"row {i}")
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline and sink.written < 3:
+            time.sleep(0.01)
+        assert sink.written == 3
+    finally:
+        sink.close()
+
+
+def test_flush_and_close_write_everything(tmp_path):
+    path = str(tmp_path / "log.csv")
+    sink = LogSink([CsvLogWriter(path)], max_delay=60)
+    sink.log("a")
+    sink.flush()
+    with open(path) as file:
+        assert file.read().count("\n") == 1
+    sink.log("b")
+    sink.close()
+    with open(path) as file:
+        assert file.read().count("\n") == 2
+
+
+def test_flush_times_out_while_the_files_are_held(tmp_path):
+    path = str(tmp_path / "log.csv")
+    sink = LogSink([CsvLogWriter(path)], max_delay=60)
+    try:
+        with sink.exclusive():
+            sink.log("LIGHTS turned ON")
+            start = time.monotonic()
+            assert sink.flush(timeout=0.1) is False
+            assert time.monotonic() - start < 1.0
+        assert sink.flush(timeout=1.0) is True
+        with open(path) as file:
+            assert file.read().strip().endswith("LIGHTS turned ON")
+    finally:
+        sink.close()
@@ -0,0 +1,77 @@
+import datetime
+
+from logstore import LogStore, parse_duration, split_by_day
+
+
+def test_parse_duration():
+    assert parse_duration("0:00:15") == 15
+    assert parse_duration("1:02:03.5") == 3723.5
+    assert parse_duration("2 days, 0:00:01") == 2 * 86400 + 1
+    assert parse_duration("None") is None
+    assert parse_duration("garbage") is None
+
+
+def test_split_by_day_spans_midnight():
+    end = datetime.datetime(2025, 3, 2, 1, 0, 0)
+    assert split_by_day(end, 3 * 3600) == [("2025-03-01", 7200.0), ("2025-03-02", 3600.0)]
+    assert split_by_day(end, 60) == [("2025-03-02", 60.0)]
+
+
+def store_with(tmp_path, rows):
+    store = LogStore(str(tmp_path / "logs.db"))
+    store.write_rows(rows)
+    return store
+
+
+ROWS = [
+    ("2025-03-01", "22:00:00", "lobby:LIGHTS turned ON"),
+    ("2025-03-02", "01:00:00", "lobby:LIGHTS turned OFF after 3:00:00"),
+    ("2025-03-02", "09:00:00", "lobby:AIRCON turned ON"),
+    ("2025-03-02", "09:30:00", "lobby:AIRCON turned OFF after 0:30:00"),
+    ("2025-03-03", "08:00:00", "lobby:LIGHTS turned ON"),
+]
+
+
+def test_query_and_count(tmp_path):
+    store = store_with(tmp_path, ROWS)
+    assert store.count() == 5
+    assert store.count("2025-03-02", "2025-03-02") == 3
+    assert store.count(appliances=["lobby:AIRCON"]) == 2
+    assert store.query("2025-03-02", "2025-03-02", ["lobby:LIGHTS"]) == [ROWS[1]]
+    assert store.query(limit=2, descending=True) == [ROWS[4], ROWS[3]]
+    assert list(store.iter_query(chunk_size=2)) == ROWS
+
+
+def test_sessions_and_open_sessions(tmp_path):
+    store = store_with(tmp_path, ROWS)
+    ends, durations, appliances = store.sessions()
+    assert ends == ["2025-03-02T01:00:00", "2025-03-02T09:30:00"]
+    assert durations == [10800.0, 1800.0]
+    assert appliances == ["lobby:LIGHTS", "lobby:AIRCON"]
+    # A day of slack keeps the night session that started inside the range
+    assert "2025-03-02T01:00:00" in store.sessions("2025-03-01", "2025-03-01")[0]
+    assert store.sessions("2025-03-03") == ([], [], [])
+    assert store.open_sessions() == {"lobby:LIGHTS": "2025-03-03T08:00:00"}
+
+
+def test_usage_is_split_across_days(tmp_path):
+    store = store_with(tmp_path, ROWS)
+    assert store.usage() == {
+        "2025-03-01": {"lobby:LIGHTS": 7200.0},
+        "2025-03-02": {"lobby:LIGHTS": 3600.0, "lobby:AIRCON": 1800.0},
+    }
+    store.rebuild_usage()
+    assert store.usage("2025-03-02")["2025-03-02"]["lobby:AIRCON"] == 1800.0
+
+
+def test_migrate_csv_once_and_keeps_undated_rows(tmp_path):
+    csv_path = tmp_path / "appliance_logs.csv"
+    csv_path.write_text("12:00:00,LIGHTS turned ON\r\n"
+                        "2025-03-01,12:05:00,LIGHTS turned OFF after 0:05:00\r\n")
+    store = LogStore(str(tmp_path / "logs.db"))
+    assert store.migrate_csv(str(csv_path)) == 2
+    assert store.migrate_csv(str(csv_path)) == 0
+    assert store.count() == 1
+    assert store.undated() == [("12:00:00", "LIGHTS turned ON")]
+    assert store.usage() == {"2025-03-01": {"LIGHTS": 300.0}}
+    assert store.migrate_csv(str(tmp_path / "missing.csv")) == 0
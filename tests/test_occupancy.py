@@ -0,0 +1,93 @@
+import pytest
+
+from occupancy import OccupancyStateMachine, ENTERED, LEFT, WARNING, ON, OFF
+
+
+def kinds(events):
+    return [(event.kind, event.appliance) for event in events]
+
+
+def machine(**options):
+    options.setdefault("warning_after", 10)
+    options.setdefault("off_after", 15)
+    return OccupancyStateMachine(("LIGHTS", "AIRCON"), clock=lambda: 0.0, **options)
+
+
+def test_single_frame_blip_does_not_switch_on():
+    occupancy = machine()
+    assert occupancy.update(True, now=0.0) == ()
+    for t in range(1, 10):
+        assert occupancy.update(False, now=t * 0.1) == ()
+    assert occupancy.all_off()
+
+
+def test_n_of_m_vote_enters_once():
+    occupancy = machine()
+    occupancy.update(True, now=0.0)
+    occupancy.update(True, now=0.1)
+    events = occupancy.update(True, now=0.2)
+    assert kinds(events) == [(ENTERED, None), (ON, "LIGHTS"), (ON, "AIRCON")]
+    for t in range(3, 20):
+        assert occupancy.update(True, now=t * 0.1) == ()
+
+
+def test_hysteresis_and_per_appliance_timeouts():
+    occupancy = machine(timeouts={"AIRCON": 20})
+    for t in range(5):
+        occupancy.update(True, now=t * 0.1)
+    # 3 of 5 positives is not enough to leave; 1 of 5 is
+    assert occupancy.update(False, now=0.5) == ()
+    assert occupancy.update(False, now=0.6) == ()
+    assert occupancy.update(False, now=0.7) == ()
+    assert kinds(occupancy.update(False, now=0.8)) == [(LEFT, None)]
+    assert kinds(occupancy.update(False, now=10.9)) == [(WARNING, None)]
+    assert kinds(occupancy.update(False, now=15.9)) == [(OFF, "LIGHTS")]
+    assert occupancy.update(False, now=16.0) == ()
+    assert kinds(occupancy.update(False, now=20.9)) == [(OFF, "AIRCON")]
+    assert occupancy.update(False, now=30.0) == ()
+
+
+def test_debounce_delays_entry():
+    occupancy = machine(debounce=1.0)
+    for t in range(10):
+        assert occupancy.update(True, now=t * 0.1) == ()
+    assert kinds(occupancy.update(True, now=1.2))[0] == (ENTERED, None)
+
+
+def test_reset_after_manual_off_reenters():
+    occupancy = machine()
+    for t in range(5):
+        occupancy.update(True, now=t * 0.1)
+    for appliance in ("LIGHTS", "AIRCON"):
+        occupancy.set_appliance(appliance, False)
+    occupancy.reset(now=1.0)
+    assert not occupancy.present
+    occupancy.update(True, now=1.1)
+    occupancy.update(True, now=1.2)
+    assert kinds(occupancy.update(True, now=1.3)) == [(ENTERED, None), (ON, "LIGHTS"), (ON, "AIRCON")]
+
+
+def test_invalid_thresholds():
+    with pytest.raises(ValueError):
+        machine(window=5, votes_on=2, votes_off=2)
+
+
+def test_each_source_votes_in_its_own_window():
+    # Three cameras, only "door" sees someone: the other two must not outvote it
+    occupancy = machine()
+    events = []
+    for t in range(5):
+        for source in ("door", "desk", "window"):
+            events.extend(occupancy.update(source == "door", now=t * 0.1, source=source))
+    assert kinds(events) == [(ENTERED, None), (ON, "LIGHTS"), (ON, "AIRCON")]
+    assert occupancy.present and occupancy.positives == 5
+
+    # Leaving needs every window at votes_off or below
+    for t in range(5, 10):
+        occupancy.update(False, now=t * 0.1, source="door")
+        assert occupancy.update(True, now=t * 0.1, source="desk") == ()
+    assert occupancy.present
+    for t in range(10, 14):
+        events = occupancy.update(False, now=t * 0.1, source="desk")
+    assert kinds(events) == [(LEFT, None)]
+    assert occupancy.positives == 1
@@ -0,0 +1,18 @@
+import pytest
+
+from replay import SyntheticSource, main, replay
+
+
+def test_synthetic_replay_scores_the_occupancy_decision():
+    source = SyntheticSource(seconds=40.0, occupied=((10.0, 25.0),))
+    report = replay(source, source.occupied, measure_memory=False)
+    assert report["frames"] == 600
+    assert report["accuracy"]["accuracy"] >= 0.95
+    assert report["transitions"] >= 2
+    assert report["latency_ms"]["total"]["p50"] > 0
+
+
+def test_unknown_mode_is_a_usage_error():
+    with pytest.raises(SystemExit) as exc:
+        main(["--synthetic", "--mode", "foo"])
+    assert exc.value.code == 2
@@ -0,0 +1,127 @@
+from rooms import Room, OCCUPIED, WAITING, VACATED, IDLE
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def step(self, seconds):
+        self.now += seconds
+        return self.now
+
+
+def occupied_room(clock, logs):
+    room = Room(clock=clock, log=logs.append)
+    for _ in range(5):
+        clock.step(0.1)
+        room.update(True)
+    return room
+
+
+def test_transitions_are_logged_once():
+    clock, logs = FakeClock(), []
+    room = occupied_room(clock, logs)
+    for _ in range(50):
+        clock.step(0.1)
+        assert room.update(True) == OCCUPIED
+    assert logs == ["LIGHTS turned ON", "AIRCON turned ON"]
+
+
+def test_room_vacates_after_off_after():
+    clock, logs = FakeClock(), []
+    room = occupied_room(clock, logs)
+    statuses = []
+    for _ in range(200):
+        clock.step(0.1)
+        statuses.append(room.update(False))
+    assert WAITING in statuses and VACATED in statuses
+    assert statuses[-1] == IDLE
+    assert not any(room.appliance_states.values())
+    assert [line.split(" after ")[0] for line in logs[2:]] == ["LIGHTS turned OFF", "AIRCON turned OFF"]
+
+
+def test_detection_after_manual_off_turns_appliances_back_on():
+    clock, logs = FakeClock(), []
+    room = occupied_room(clock, logs)
+    room.turn_off_appliances()
+    assert not any(room.appliance_states.values())
+    statuses = []
+    for _ in range(20):
+        clock.step(0.1)
+        statuses.append(room.update(True))
+    assert all(room.appliance_states.values())
+    assert statuses[-1] == OCCUPIED
+    assert logs.count("LIGHTS turned ON") == 2
+
+
+def test_engine_start_fails_on_a_missing_model(tmp_path):
+    from rooms import RoomRegistry, PresenceEngine
+
+    registry = RoomRegistry()
+    registry.add_room("lobby")
+    registry.add_camera("lobby-0", 0, "lobby", detector="dnn")
+    engine = PresenceEngine(registry, workers=1,
+                            detector_options={"dnn": {"model_path": str(tmp_path / "missing.onnx")}})
+    try:
+        engine.start()
+    except RuntimeError as exc:
+        assert "failed to load" in str(exc)
+    else:
+        engine.stop()
+        raise AssertionError("start() accepted a missing model")
+    assert engine.stopped.is_set() and engine._executors == []
+
+
+def test_one_of_three_cameras_keeps_the_room_occupied():
+    clock, logs = FakeClock(), []
+    room = Room(clock=clock, log=logs.append)
+    statuses = []
+    for _ in range(30):
+        clock.step(0.1)
+        for camera_id in ("hall-0", "hall-1", "hall-2"):
+            statuses.append(room.update(camera_id == "hall-1", source=camera_id))
+    assert statuses[-1] == OCCUPIED
+    assert all(room.appliance_states.values())
+    assert logs == ["LIGHTS turned ON", "AIRCON turned ON"]
+
+
+def test_dnn_cameras_share_a_worker():
+    from rooms import RoomRegistry, PresenceEngine
+
+    registry = RoomRegistry()
+    registry.add_room("lobby")
+    for n in range(5):
+        registry.add_camera(f"dnn-{n}", n, "lobby", detector="dnn")
+    for n in range(3):
+        registry.add_camera(f"haar-{n}", 10 + n, "lobby")
+    engine = PresenceEngine(registry, workers=4, batch_size=4)
+    workers = {camera.camera_id: worker for camera, worker in engine.assign_workers()}
+    assert [workers[f"haar-{n}"] for n in range(3)] == [0, 1, 2]
+    assert [workers[f"dnn-{n}"] for n in range(5)] == [3, 3, 3, 3, 0]
+
+
+def test_occupied_gauge_tracks_presence_not_appliances():
+    from metrics import OCCUPIED as OCCUPIED_GAUGE
+
+    clock, logs = FakeClock(), []
+    room = Room("gauge-room", clock=clock, log=logs.append)
+    gauge = OCCUPIED_GAUGE.labels(room.metrics_label)
+    for _ in range(5):
+        clock.step(0.1)
+        room.update(True)
+    assert gauge.value == 1
+    for _ in range(10):
+        clock.step(0.1)
+        room.update(False)
+    # Left, but still inside the off_after hold-off with the appliances on
+    assert all(room.appliance_states.values())
+    assert gauge.value == 0
+    for _ in range(5):
+        clock.step(0.1)
+        room.update(True)
+    assert gauge.value == 1
+    room.turn_off_appliances()
+    assert gauge.value == 0
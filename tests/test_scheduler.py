@@ -0,0 +1,95 @@
+import threading
+import types
+
+from occupancy import OccupancyStateMachine
+from scheduler import FrameScheduler, Throttle
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(load=0.0, **options):
+    clock = FakeClock()
+    occupancy = OccupancyStateMachine(["LIGHTS"], clock=clock)
+    room = types.SimpleNamespace(name="lobby", occupancy=occupancy, clock=clock)
+    monitor = types.SimpleNamespace(load=load)
+    return FrameScheduler(room, monitor=monitor, **options), occupancy, clock
+
+
+def feed(occupancy, clock, detected, seconds, fps=15.0):
+    for _ in range(int(seconds * fps)):
+        clock.now += 1.0 / fps
+        occupancy.update(detected)
+
+
+def test_steady_rooms_drop_to_the_steady_rates():
+    scheduler, occupancy, clock = make_scheduler()
+    assert scheduler.target_fps() == 15.0
+    clock.now = 31.0
+    assert scheduler.target_fps() == 2.0
+
+    feed(occupancy, clock, True, 1)
+    assert occupancy.present
+    assert scheduler.target_fps() == 15.0
+    feed(occupancy, clock, True, 30)
+    assert scheduler.target_fps() == 1.0
+
+    # One negative frame in an occupied room breaks the unanimous window
+    occupancy.update(False)
+    assert scheduler.target_fps() == 15.0
+
+
+def test_off_countdown_runs_at_the_active_rate():
+    scheduler, occupancy, clock = make_scheduler(settle_after=5.0)
+    feed(occupancy, clock, True, 1)
+    feed(occupancy, clock, False, 7)
+    assert not occupancy.present and not occupancy.all_off()
+    assert scheduler.target_fps() == 15.0
+    feed(occupancy, clock, False, 10)
+    assert occupancy.all_off()
+    assert scheduler.target_fps() == 2.0
+
+
+def test_interval_backs_off_under_load():
+    scheduler, _, clock = make_scheduler(load=1.5, load_budget=0.75, min_fps=0.5)
+    assert scheduler.interval() == 1.0 / 7.5
+    clock.now = 31.0
+    assert scheduler.interval() == 1.0 / 1.0
+    scheduler.monitor.load = 10.0
+    assert scheduler.interval() == 1.0 / 0.5
+    assert scheduler.fps == 0.5
+
+
+def test_throttle_grabs_frames_between_samples():
+    class Source:
+        grabs = 0
+
+        def grab(self):
+            self.grabs += 1
+
+    scheduler = types.SimpleNamespace(interval=lambda: 60.0)
+    stop = threading.Event()
+    stop.set()  # never actually wait
+    throttle = Throttle(scheduler, stop)
+    source = Source()
+    assert throttle.due(source)
+    assert not throttle.due(source)
+    assert not throttle.due(source)
+    assert throttle.skipped == 2 and source.grabs == 2
+    assert Throttle(None, stop).due(source)
+
+
+def test_throttle_rechecks_the_interval_while_waiting():
+    # The interval is booked at capture time; a later rate increase (the
+    # frame's detection landing) must shorten the wait already in progress
+    scheduler = types.SimpleNamespace(interval=lambda: 60.0)
+    throttle = Throttle(scheduler, threading.Event(), poll=0.01)
+    assert throttle.due(object())
+    assert not throttle.due(object())
+    scheduler.interval = lambda: 0.0
+    assert throttle.due(object())